@@ -0,0 +1,302 @@
+# Development benchmarks, not loaded by the plugin, run them from the console of Sublime Text
+#
+#   from LaTeXing.dev import benchmark; print(benchmark.run("TeX Parser"))
+
+import os
+import random
+import re
+import tabulate
+import tempfile
+import time
+
+from ..latexing import cache
+from ..latexing import logger
+from ..latexing import parser
+
+log = logger.getLogger(__name__)
+
+
+# Frozen copy of the regex parser replaced by parser.scan_commands, the baseline of the TeX Parser benchmark
+def legacy_end_of_argument(string, offset, openPattern, closePattern, balance=0):
+    log.trace("%s, %s, %s, %s, %s" % (string, offset, openPattern, closePattern, balance))
+
+    reOpen = re.compile(openPattern)
+    rePair = re.compile(r"^[%s%s]|(?<=[^\\])[%s%s]" % (openPattern, closePattern, openPattern, closePattern))
+    index = -1
+
+    brakets = rePair.finditer(string, offset)
+    for braket in brakets:
+        index = braket.end()
+        balance += 1 if reOpen.match(braket.group()) else -1
+
+        # Break of balance was even or less (probably a bib file misstake)
+        if balance <= 0:
+            break
+
+    # Set index to the last index of string
+    if index < 0 and balance <= 0:
+        return "NoMatch"
+    elif balance > 0:
+        return "Unclosed:%d" % balance
+
+    return index
+
+
+def legacy_bracket_pairs(string, openPattern, closePattern, offset=0, singlePair=False):
+    log.trace("%s, %s, %s, %s, %s" % (string, openPattern, closePattern, offset, singlePair))
+
+    pairs = []
+    reOpen = re.compile(r"^(?:[\n\r\t\s]*)([%s])" % "".join(openPattern))
+    string = string[offset:]
+
+    exOpen = reOpen.search(string)
+    while exOpen:
+        for i in range(len(openPattern)):
+            if re.match(openPattern[i], exOpen.group(1)):
+                start = exOpen.end() - len(exOpen.group(1))
+                end = legacy_end_of_argument(string, start, openPattern[i], closePattern[i])
+                if isinstance(end, int):
+                    pairs += [{"pair": exOpen.group(1), "start": offset + start, "end": offset + end, "content": string[start:end]}]
+                    offset += end
+                else:
+                    end = len(string)
+                break
+
+        if singlePair:
+            break
+
+        string = string[end:]
+        exOpen = reOpen.search(string)
+
+    return pairs
+
+
+def legacy_end_of_command(line, offset=0, open_expr=None):
+    # Search for unclosed argument
+    if open_expr:
+        if open_expr["start"] == "{":
+            end = legacy_end_of_argument(line, offset, r"\{", r"\}", open_expr["balance"])
+        elif open_expr["start"] == "[":
+            end = legacy_end_of_argument(line, offset, r"\[", r"\]", open_expr["balance"])
+        elif open_expr["start"] == "(":
+            end = legacy_end_of_argument(line, offset, r"\(", r"\)", open_expr["balance"])
+        if isinstance(end, int):
+            offset = end
+        elif end[0:8] == "Unclosed":
+            return "Unclosed:%s:%s" % (open_expr["start"], end[9:])
+
+        # Just to support ^ in regex
+    line = line[offset:]
+
+    rex = re.compile(r"^(?P<start>[\{\[\(])")
+    expr = rex.search(line)
+
+    # Search for command
+    while expr:
+        if expr.group("start") == "{":
+            end = legacy_end_of_argument(line, expr.end("start"), r"\{", r"\}", 1)
+        elif expr.group("start") == "[":
+            end = legacy_end_of_argument(line, expr.end("start"), r"\[", r"\]", 1)
+        elif expr.group("start") == "(":
+            end = legacy_end_of_argument(line, expr.end("start"), r"\(", r"\)", 1)
+        if isinstance(end, int):
+            offset += end
+            line = line[end:]
+            expr = rex.search(line)
+        elif end[0:8] == "Unclosed":
+            return "Unclosed:%s:%s" % (expr.group("start"), end[9:])
+        else:
+            break
+    return offset
+
+
+def legacy_split_command(string, offset=0, strip=True):
+    rexName = re.compile(r"(?<=\\)([^\{\[\(]+)")
+    pattern = [["\\{", "\\[", "\\("], ["\\}", "\\]", "\\)"]]
+    try:
+        # Find command name
+        expr = rexName.search(string)
+        name = expr.group(0)
+    except Exception as e:
+        log.error(e)
+        return "SplitError"
+
+    items = legacy_bracket_pairs(string, pattern[0], pattern[1], expr.end())
+    log.trace("name: %s, items: %s" % (name, items))
+    if strip:
+        arguments = [{"pair": item["pair"], "start": offset + item["start"] + len(item["pair"]), "end": offset + item["end"] - len(item["pair"]), "content": item["content"][len(item["pair"]):-len(item["pair"])]} for item in items]
+    else:
+        arguments = [{"pair": item["pair"], "start": offset + item["start"], "end": offset + item["end"], "content": item["content"]} for item in items]
+    return {"name": name, "arguments": arguments}
+
+
+def legacy_find_command_arguments(file_lines, cmd, single=False):
+    rex = re.compile(r'\\' + cmd + r'(?P<start>[\{\[\(])(?P<content>[^\}\]\)]+)[\}\]\)]') if single else re.compile(r'\\' + cmd + r'(?P<start>[\{\[\(])')
+    open_expr = None
+
+    args = []
+    tags = []
+
+    # Search line by line
+    for line in file_lines:
+
+        # If unclosed item available
+        if open_expr:
+            end = legacy_end_of_command(line["content"], 0, open_expr)
+            if isinstance(end, int):
+                # Save item, check tag existince
+                tag = open_expr["line"] + line["content"][:end]
+                command = legacy_split_command(tag)
+                if tag not in tags:
+                    tags += [tag]
+                    args += [{"tag": tag, "line": open_expr["line_number"], "arguments": ["%s:%s" % (c["pair"], c["content"]) for c in command["arguments"]]}]
+                open_expr = None
+            elif end[0:8] == "Unclosed":
+                open_expr = {"line": open_expr["line"] + line["content"], "line_number": open_expr["line_number"], "start": end[9], "balance": int(end[11:])}
+
+        # Normal search
+        for expr in rex.finditer(line["content"]):
+
+            start = expr.start()
+            end = expr.end() if single else legacy_end_of_command(line["content"], expr.start("start"))
+            if isinstance(end, int):
+                # Save item, check tag existince
+                tag = line["content"][start:end]
+                if tag not in tags:
+                    tags += [tag]
+                    if single:
+                        args += [{"tag": tag, "line": line["line_number"], "arguments": ["%s:%s" % (expr.group("start"), expr.group("content"))]}]
+                    else:
+                        command = legacy_split_command(tag)
+                        args += [{"tag": tag, "line": line["line_number"], "arguments": ["%s:%s" % (c["pair"], c["content"]) for c in command["arguments"]]}]
+            elif end[0:8] == "Unclosed":
+                open_expr = {"line": line["content"][start:], "line_number": line["line_number"], "start": end[9], "balance": int(end[11:])}
+
+    return args
+
+
+def measure(function, repeat):
+    # Best of several runs to hide the noise of the plugin host
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        function()
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+    return best
+
+
+def synthetic_library(items):
+    r = random.Random(items)
+    words = ["analysis", "bayesian", "carbon", "dynamics", "efficient", "fluid", "graph", "hybrid", "inference", "journal", "kernel", "lattice", "model", "network", "optimal", "quantum", "random", "stochastic", "theory", "vector"]
+    names = ["Knuth", "Lamport", "Turing", "Hopper", "Dijkstra", "Lovelace", "Shannon", "Noether", "Gauss", "Euler"]
+    data = []
+    for i in range(items):
+        data += [{
+            "key": "%s%d%s" % (r.choice(names).lower(), 1950 + i % 70, i),
+            "type": r.choice(["article", "book", "inproceedings", "misc"]),
+            "author": " and ".join(r.sample(names, r.randint(1, 4))),
+            "title": " ".join(r.choice(words) for j in range(r.randint(4, 12))).capitalize(),
+            "journal": " ".join(r.sample(words, 3)).title(),
+            "year": str(1950 + i % 70),
+            "pages": "%d--%d" % (i % 300, i % 300 + r.randint(1, 30)),
+            "document_id": "%032x" % r.getrandbits(128)
+        }]
+    return {"rtime": "01.01.2015T00:00:00", "data": {"cites": data}}
+
+
+def synthetic_tex_cache(items):
+    r = random.Random(items)
+    words = ["the", "result", "of", "experiment", "model", "shows", "that", "quantum", "lattice", "network", "is", "stable", "under", "random", "noise"]
+    data = {}
+    for i in range(max(1, items // 200)):
+        file_path = "/home/user/thesis/chapters/chapter%d.tex" % i
+        data[file_path] = {
+            "fingerprint": {"mtime": 1420070400000000000 + i, "size": 40000 + i, "version": 1},
+            "label": [{"tag": "\\label{sec:%d:%d}" % (i, j), "line": j * 10, "arguments": ["{:sec:%d:%d" % (i, j)]} for j in range(40)],
+            "ref": [{"tag": "\\ref{sec:%d:%d}" % (i, j), "line": j * 7, "arguments": ["{:sec:%d:%d" % (i, j)]} for j in range(80)],
+            "words": [[" ".join(r.choice(words) for k in range(r.randint(3, 5))), r.randint(2, 20)] for j in range(2000)]
+        }
+    return {"rtime": "01.01.2015T00:00:00", "data": data}
+
+
+def synthetic_tex_document(lines):
+    r = random.Random(lines)
+    words = ["the", "result", "of", "experiment", "model", "shows", "that", "quantum", "lattice", "network", "is", "stable", "under", "random", "noise"]
+    commands = [
+        "\\section{Section %d}\\label{sec:%d}",
+        "as shown in Figure~\\ref{fig:%d} and \\eqref{eq:%d}",
+        "see \\cite{knuth%d} and \\cite[p.~%d]{lamport}",
+        "\\newcommand{\\vec%d}[1]{\\mathbf{#1}_{%d}}",
+        "\\acro{AC%d}{Acronym number %d}",
+        "\\include{chapters/chapter%d} and page %d",
+        "\\textbf{bold %d} and \\emph{emphasis %d}"
+    ]
+    content = ["\\documentclass[11pt,a4paper]{report}", "\\usepackage{amsmath,graphicx}", "\\begin{document}"]
+    for i in range(lines):
+        if i % 4:
+            content += [" ".join(r.choice(words) for j in range(r.randint(6, 14)))]
+        else:
+            content += [r.choice(commands) % (i, i)]
+    content += ["\\end{document}"]
+    return parser.SourceLines("\n".join(content))
+
+
+def benchmark_tex_parser(items, repeat):
+    lines = max(1, items // 3)
+    file_lines = synthetic_tex_document(lines)
+
+    # The legacy parser reads the lines as dicts
+    legacy_lines = [{"line_number": line_number, "content": content} for line_number, content in file_lines]
+
+    def scan_separately():
+        for key, (cmd, single) in parser.TEX_COMMANDS.items():
+            legacy_find_command_arguments(legacy_lines, cmd, single)
+
+    table = []
+    table += [["regex, %d commands" % len(parser.TEX_COMMANDS), lines, "%.3f s" % measure(scan_separately, repeat)]]
+    table += [["single pass", lines, "%.3f s" % measure(lambda: parser.scan_commands(file_lines, parser.TEX_COMMANDS), repeat)]]
+    return ["Parser", "Lines", "Time"], table
+
+
+def benchmark_cache_format(items, repeat):
+    file_json = synthetic_library(items)
+    table = []
+    for name, binary in [["json", False], ["binary", True]]:
+        content = cache.encode_cache(file_json, binary)
+        encode = measure(lambda: cache.encode_cache(file_json, binary), repeat)
+        decode = measure(lambda: cache.decode_cache(content), repeat)
+        table += [[name, items, "%.1f MB" % (len(content) / 1000000), "%.3f s" % encode, "%.3f s" % decode]]
+    return ["Format", "Items", "Size", "Encode", "Decode"], table
+
+
+def benchmark_cache_compression(items, repeat):
+    table = []
+    for cache_name, file_json in [["zotero.cache", synthetic_library(items)], ["tex.cache", synthetic_tex_cache(items)]]:
+        for codec, name in sorted(cache.CACHE_CODEC_NAMES.items()):
+            if codec and not cache.CACHE_CODECS[codec]:
+                continue
+            content = cache.encode_cache(file_json, True, codec)
+            file_path = os.path.join(tempfile.gettempdir(), "latexing-benchmark.cache")
+            with open(file_path, 'wb') as f:
+                f.write(content)
+            try:
+                encode = measure(lambda: cache.encode_cache(file_json, True, codec), repeat)
+                load = measure(lambda: cache.CACHE.read_cache(file_path), repeat)
+            finally:
+                os.remove(file_path)
+            table += [[cache_name, name, "%.1f MB" % (len(content) / 1000000), "%.3f s" % encode, "%.3f s" % load]]
+    return ["Cache", "Compression", "Size", "Encode", "Load"], table
+
+
+BENCHMARKS = [["Cache Format", benchmark_cache_format], ["Cache Compression", benchmark_cache_compression], ["TeX Parser", benchmark_tex_parser]]
+
+
+def run(name=None, items=60000, repeat=3):
+    tables = []
+    for benchmark_name, function in BENCHMARKS:
+        if name and name != benchmark_name:
+            continue
+        headers, table = function(items, repeat)
+        tables += ["Benchmark: %s\n%s" % (benchmark_name, tabulate.tabulate(table, headers, tablefmt="grid"))]
+    return "\n\n".join(tables)
@@ -25,8 +25,10 @@ from .compiler import LtxDefaultCompilerCommand
 from .compiler import LtxQuickBuildCompilerCommand
 from .compiler import LtxTikzCompilerCommand
 
+from .commands import LtxFoldAllSectionsCommand
 from .commands import LtxFoldEnvironmentCommand
 from .commands import LtxFoldSectionCommand
+from .commands import LtxGotoSectionCommand
 from .commands import LtxInsertLatexEnvironmentCommand
 from .commands import LtxLatexCommandCommand
 from .commands import LtxLatexEnvironmentCommand
@@ -1,16 +1,25 @@
 import sublime
 import sublime_plugin
 
+import collections
 import datetime
+import marshal
+import mmap
 import os
 import re
+import shutil
 import stat
+import struct
+import tabulate
 import threading
+import time
+import zlib
 
 from . import LTX_TESTING
 from . import LTX_TEMPDIR
 from . import bib
 from . import logger
+from . import parser
 from . import progress
 from . import terminal
 from . import tools
@@ -19,6 +28,16 @@ from .api import citeulike
 from .api import mendeley
 from .api import zotero
 
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
 log = logger.getLogger(__name__)
 
 
@@ -56,7 +75,7 @@ class LtxRebuildCacheCommand(sublime_plugin.WindowCommand):
 
             # Clear the whole cache variable
             if i == 0 and not soft:
-                CACHE.cache_data = {}
+                CACHE.reset()
 
             message = ["Rebuilding Cache Information...", "Finished Caching"]
             progress.progress_function(lambda: cache(cache_items), message[0], message[1], lambda: tools.LtxSettings().set("ltx_rebuild_cache", False))
@@ -75,13 +94,23 @@ class LtxShowCacheCommand(sublime_plugin.WindowCommand):
     def run(self):
 
         # Get items for list
-        items = [key for key in CACHE.cache_data.keys()]
+        items = ["Statistics"] + [key for key in CACHE.cache_data.keys()]
 
         def on_done(i):
             if i < 0:
                 return
+            if i == 0:
+                view = self.window.new_file()
+                view.set_name("temp::statistics")
+                view.set_scratch(True)
+                view.settings().set('word_wrap', False)
+                view.set_read_only(True)
+                view.run_command("ltx_append_text", {"string": CACHE.summary()})
+                view.run_command("ltx_select_point", {"point": 0})
+                return
             key = items[i]
-            value = CACHE.cache_data[key]
+            CACHE.get_cache_data(key)
+            value = CACHE.get_cache(key)
             view = self.window.new_file()
             view.set_name("temp::" + key)
             view.set_scratch(True)
@@ -92,87 +121,908 @@ class LtxShowCacheCommand(sublime_plugin.WindowCommand):
         sublime.set_timeout(lambda: self.window.show_quick_panel(items, on_done), 0)
 
 
+def entry_size(entry):
+    # Size of the uncompressed entry to measure the memory budget
+    try:
+        return len(marshal.dumps(entry))
+    except ValueError:
+        return len(sublime.encode_value(entry))
+
+
+def entry_meta(entry):
+    # Fields to refresh and collect the cache without loading the entries
+    return {key: entry[key] for key in ["root", "atime", "fingerprint"] if key in entry}
+
+
+def symbol_rows(file_path, entry, tex_extension=".tex"):
+    rows = {}
+    for table, key in SQL_TABLES.items():
+        rows[table] = []
+        for item in entry[key] if key in entry else []:
+            if isinstance(item, str):
+                rows[table] += [(file_path, item, 0, sublime.encode_value(item), None)]
+                continue
+            for name in symbol_names(key, item):
+                child = None
+                if key == "input":
+                    # Resolve the child against the root directory like TeXFile.input_paths
+                    file_name = name if os.path.splitext(name)[1] else tools.add_extension(name, tex_extension)
+                    root_file_path = entry["root"] if entry.get("root") else file_path
+                    child = os.path.normpath(os.path.join(os.path.dirname(root_file_path), file_name))
+                rows[table] += [(file_path, name, item["line"] if "line" in item else 0, sublime.encode_value(item), child)]
+    return rows
+
+
+class PackStorage(object):
+
+    def __init__(self, cache, file_name):
+        self.cache = cache
+        self.file_name = file_name
+        self.name = os.path.splitext(file_name)[0]
+        self.pack = None
+        self.index = {}
+        self.removed = set()
+        self.map = None
+        self.lock = threading.Lock()
+
+    def pack_path(self, pack=None):
+        return self.cache.cache_path(pack if pack else self.pack)
+
+    def load(self):
+        file_json = self.cache.read_cache(self.cache.cache_path(self.file_name))
+        if "pack" in file_json:
+            # Just the offset index, the entries are loaded on demand
+            with self.lock:
+                self.close()
+                self.pack = file_json["pack"]
+                self.index = file_json["index"]
+            return {"rtime": file_json["rtime"], "data": {}}
+        elif "shards" in file_json:
+            # Shards of an older version, moved into the pack with the next save
+            data = {}
+            for key, digest in file_json["shards"].items():
+                try:
+                    data[key] = self.cache.read_cache(os.path.join(self.cache.cache_path(self.name), digest + ".cache"))
+                except Exception:
+                    pass
+            with self.lock:
+                self.index = {}
+            return {"rtime": file_json["rtime"], "data": data}
+        elif "data" in file_json:
+            # Monolithic cache of an older version
+            with self.lock:
+                self.index = {}
+            return file_json
+        raise Exception
+
+    def open(self, end):
+        # Map the pack once and just slice the entries, remap if it grew since
+        if self.map is not None and len(self.map) < end:
+            self.close()
+        if self.map is None:
+            with open(self.pack_path(), 'rb') as f:
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.map
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+    def read(self, key):
+        with self.lock:
+            try:
+                offset, length = self.index[key][:2]
+                return decode_cache(self.open(offset + length)[offset:offset + length])
+            except Exception as e:
+                log.error("%s %s (%s)" % (self.file_name, key, e))
+                return None
+
+    def keys(self):
+        # The index changes with a save in the background, callers iterate over a copy
+        with self.lock:
+            return list(self.index.keys())
+
+    def contains(self, key):
+        with self.lock:
+            return key in self.index
+
+    def size(self, key):
+        with self.lock:
+            return self.index[key][1] if key in self.index else 0
+
+    def meta(self, key):
+        # Indexes of an older version have no meta data
+        with self.lock:
+            item = self.index.get(key)
+            return item[2] if item and len(item) > 2 else None
+
+    def memory(self, key):
+        # Decoded size of an entry, the stored size for indexes of an older version
+        with self.lock:
+            item = self.index.get(key)
+            return (item[3] if len(item) > 3 else item[1]) if item else 0
+
+    def remove(self, key):
+        with self.lock:
+            self.index.pop(key, None)
+            self.removed.add(key)
+
+    def reset(self):
+        with self.lock:
+            self.removed.update(self.index.keys())
+            self.index = {}
+
+    def begin_save(self):
+        # Called with the snapshot taken, keys removed from now on are dropped again after the save
+        with self.lock:
+            self.removed = set()
+
+    def save(self, file_json, dirty):
+        data = file_json["data"]
+        binary, codec = self.cache.is_binary(), self.cache.codec()
+        entries = {key: encode_cache(data[key], binary, codec) for key in dirty if key in data}
+        memory = {key: entry_size(data[key]) for key in entries.keys()}
+
+        with self.lock:
+            for key in entries.keys():
+                self.index.pop(key, None)
+            size = sum(item[1] for item in self.index.values())
+            pack_size = os.path.getsize(self.pack_path()) if self.pack and os.path.isfile(self.pack_path()) else 0
+            if not pack_size:
+                self.index = {}
+
+            if pack_size and pack_size - size <= max(size, PACK_SLACK):
+                # Append the changed entries, the old ones stay as garbage
+                with open(self.pack_path(), 'ab') as f:
+                    f.seek(0, os.SEEK_END)
+                    for key, content in entries.items():
+                        self.index[key] = [f.tell(), len(content), entry_meta(data[key]), memory[key]]
+                        f.write(content)
+            else:
+                # Compact the pack into a new generation
+                generation = int(self.pack.rsplit(".", 2)[1]) + 1 if self.pack else 0
+                pack = "%s.%d.data" % (self.name, generation)
+                index = {}
+                if not os.path.isdir(self.cache.cache_path()):
+                    os.makedirs(self.cache.cache_path())
+                with open(self.pack_path(pack) + ".tmp", 'wb') as f:
+                    for key, item in sorted(self.index.items(), key=lambda x: x[1][0]):
+                        offset, length = item[:2]
+                        index[key] = [f.tell()] + item[1:]
+                        f.write(self.open(offset + length)[offset:offset + length])
+                    for key, content in entries.items():
+                        index[key] = [f.tell(), len(content), entry_meta(data[key]), memory[key]]
+                        f.write(content)
+                os.replace(self.pack_path(pack) + ".tmp", self.pack_path(pack))
+                self.close()
+                self.pack = pack
+                self.index = index
+
+            # Removed while the entries were encoded, the written ones must not come back
+            for key in self.removed:
+                self.index.pop(key, None)
+            self.removed = set()
+
+            content = encode_cache({"rtime": file_json["rtime"], "pack": self.pack, "index": self.index}, binary, codec)
+            self.cache.write_cache(self.cache.cache_path(self.file_name), content)
+            log.info("%s (%s, %d of %d entries)" % (self.file_name, tools.size_of_string(content), len(entries), len(self.index)))
+            self.remove_files(self.pack)
+        return len(content) + sum(len(content) for content in entries.values())
+
+    def remove_files(self, pack=None):
+        # Remove older packs and the shards of older versions
+        for item in os.listdir(self.cache.cache_path()):
+            if item.startswith(self.name + ".") and item.endswith(".data") and item != pack:
+                os.remove(self.cache.cache_path(item))
+        if os.path.isdir(self.cache.cache_path(self.name)):
+            shutil.rmtree(self.cache.cache_path(self.name))
+
+    def clear(self):
+        with self.lock:
+            self.close()
+            if os.path.isfile(self.cache.cache_path(self.file_name)):
+                os.remove(self.cache.cache_path(self.file_name))
+            if os.path.isdir(self.cache.cache_path()):
+                self.remove_files()
+            self.pack = None
+            self.index = {}
+            self.removed = set()
+
+
+class SQLiteStorage(object):
+
+    # Databases the schema got created for
+    schemas = set()
+
+    def __init__(self, cache, file_name):
+        self.cache = cache
+        self.file_name = file_name
+        self.db_path = cache.cache_path(os.path.splitext(file_name)[0] + ".sqlite")
+        self.settings = tools.load_settings("LaTeXing", default_tex_extension=".tex")
+        self.index = {}
+        self.removed = set()
+        self.lock = threading.Lock()
+
+    def connect(self):
+        exists = os.path.isfile(self.db_path)
+        db = sqlite3.connect(self.db_path, timeout=10)
+        if exists and self.db_path in self.schemas:
+            return db
+        db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        db.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, mtime INTEGER, size INTEGER, data TEXT, meta TEXT)")
+        for table in SQL_TABLES.keys():
+            db.execute("CREATE TABLE IF NOT EXISTS %s (path TEXT, name TEXT, line INTEGER, item TEXT, child TEXT)" % table)
+            db.execute("CREATE INDEX IF NOT EXISTS %s_name ON %s (name)" % (table, table))
+            db.execute("CREATE INDEX IF NOT EXISTS %s_path ON %s (path)" % (table, table))
+        self.schemas.add(self.db_path)
+        return db
+
+    def load(self):
+        if not os.path.isfile(self.db_path):
+            raise Exception
+        db = self.connect()
+        try:
+            rtime = db.execute("SELECT value FROM meta WHERE key = 'rtime'").fetchone()
+            index = {path: [size, sublime.decode_value(meta) if meta else None] for path, size, meta in db.execute("SELECT path, length(data), meta FROM files")}
+            with self.lock:
+                self.index = index
+        finally:
+            db.close()
+        return {"rtime": rtime[0] if rtime else CACHE_RESET_RTIME, "data": {}}
+
+    def read(self, key):
+        db = self.connect()
+        try:
+            row = db.execute("SELECT data FROM files WHERE path = ?", (key,)).fetchone()
+            return sublime.decode_value(row[0]) if row else None
+        except Exception as e:
+            log.error("%s %s (%s)" % (self.file_name, key, e))
+            return None
+        finally:
+            db.close()
+
+    def keys(self):
+        with self.lock:
+            return list(self.index.keys())
+
+    def contains(self, key):
+        with self.lock:
+            return key in self.index
+
+    def size(self, key):
+        with self.lock:
+            return self.index[key][0] if key in self.index else 0
+
+    def meta(self, key):
+        with self.lock:
+            return self.index[key][1] if key in self.index else None
+
+    def memory(self, key):
+        # The entries are stored as plain json
+        return self.size(key)
+
+    def remove(self, key):
+        with self.lock:
+            if self.index.pop(key, None) is not None:
+                self.removed.add(key)
+
+    def reset(self):
+        with self.lock:
+            self.removed.update(self.index.keys())
+            self.index = {}
+
+    def begin_save(self):
+        pass
+
+    def save(self, file_json, dirty):
+        data = file_json["data"]
+        size = 0
+        # Keys removed while writing are deleted with the next save
+        with self.lock:
+            removed, self.removed = self.removed, set()
+        db = self.connect()
+        try:
+            with db:
+                db.execute("INSERT OR REPLACE INTO meta VALUES ('rtime', ?)", (file_json["rtime"],))
+                for key in removed | set(dirty):
+                    db.execute("DELETE FROM files WHERE path = ?", (key,))
+                    for table in SQL_TABLES.keys():
+                        db.execute("DELETE FROM %s WHERE path = ?" % table, (key,))
+                for key in dirty:
+                    if key not in data:
+                        continue
+                    fingerprint = data[key]["fingerprint"] if "fingerprint" in data[key] else {}
+                    str_json = sublime.encode_value(data[key])
+                    meta = entry_meta(data[key])
+                    db.execute("INSERT INTO files VALUES (?, ?, ?, ?, ?)", (key, fingerprint.get("mtime"), fingerprint.get("size"), str_json, sublime.encode_value(meta)))
+                    for table, rows in symbol_rows(key, data[key], self.settings["default_tex_extension"]).items():
+                        db.executemany("INSERT INTO %s VALUES (?, ?, ?, ?, ?)" % table, rows)
+                    with self.lock:
+                        if key not in self.removed:
+                            self.index[key] = [len(str_json), meta]
+                    size += len(str_json)
+        except Exception:
+            with self.lock:
+                self.removed |= removed
+            raise
+        finally:
+            db.close()
+        log.info("%s (%d of %d files)" % (self.file_name, len(dirty), len(self.keys())))
+        return size
+
+    def clear(self):
+        with self.lock:
+            if os.path.isfile(self.db_path):
+                os.remove(self.db_path)
+            self.index = {}
+            self.removed = set()
+
+    def is_up_to_date(self, db, file_paths):
+        # Validate the stored fingerprints of the files of a result
+        for file_path in file_paths:
+            row = db.execute("SELECT mtime, size FROM files WHERE path = ?", (file_path,)).fetchone()
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                return False
+            if not row or row[0] != st.st_mtime_ns or row[1] != st.st_size:
+                return False
+        return True
+
+    def files(self, root):
+        db = self.connect()
+        try:
+            return [path for path, in db.execute(SQL_TREE + "SELECT path FROM tree", (root,))]
+        finally:
+            db.close()
+
+    def find(self, key, name=None, root=None):
+        table = [table for table, value in SQL_TABLES.items() if value == key][0]
+        query = "SELECT path, item FROM %s WHERE 1" % table
+        args = ()
+        if root:
+            query = SQL_TREE + query + " AND path IN (SELECT path FROM tree)"
+            args += (root,)
+        if name is not None:
+            query += " AND name = ?"
+            args += (name,)
+        db = self.connect()
+        try:
+            rows = db.execute(query + " ORDER BY rowid", args).fetchall()
+            if not self.is_up_to_date(db, set(path for path, item in rows)):
+                return None
+            return [[path, sublime.decode_value(item)] for path, item in rows]
+        finally:
+            db.close()
+
+
 class Cache(object):
 
+    # Published snapshots are never changed, writers replace them under the lock
     cache_data = {}
+    storages = {}
+    dirty = {}
+    journal = None
+    lock = threading.RLock()
     timer = 0
-
-    def read_cache(self, file_name):
-        with open(os.path.join(sublime.cache_path(), "LaTeXing", file_name), 'r', encoding="utf-8") as f:
+    lru = collections.OrderedDict()
+    lru_lock = threading.Lock()
+    resident = 0
+    budget = None
+    stats_lock = threading.Lock()
+    stats = {"hits": 0, "misses": 0, "evictions": 0, "file_hits": 0, "reparses": 0}
+    timings = {}
+    parses = {}
+
+    def cache_path(self, *names):
+        return os.path.join(sublime.cache_path(), "LaTeXing", *names)
+
+    def read_cache(self, file_path):
+        with open(file_path, 'rb') as f:
             log.trace("%s", f)
-            str_json = f.read()
-        log.info("%s (%s)" % (file_name, tools.size_of_string(str_json)))
-        return str_json
+            header = f.read(CACHE_HEADER_SIZE)
+            codec = read_header(header)
+            if not codec:
+                return decode_cache(header + f.read())
+            # Decompress while reading instead of holding the whole compressed file
+            decompressor = zlib.decompressobj() if codec == 1 else lzma.LZMADecompressor()
+            chunks = [decompressor.decompress(chunk) for chunk in iter(lambda: f.read(CACHE_CHUNK_SIZE), b"")]
+            if codec == 1:
+                chunks += [decompressor.flush()]
+        return marshal.loads(b"".join(chunks))
+
+    def write_cache(self, file_path, content):
+        # Write to a temporary file first to never leave a truncated cache behind
+        with open(file_path + ".tmp", 'wb') as f:
+            log.trace("%s", f)
+            f.write(content)
+        os.replace(file_path + ".tmp", file_path)
+
+    def is_binary(self):
+        return tools.load_settings("LaTeXing", cache_format="binary")["cache_format"] == "binary"
+
+    def codec(self):
+        compression = tools.load_settings("LaTeXing", cache_compression="zlib")["cache_compression"]
+        codecs = {name: codec for codec, name in CACHE_CODEC_NAMES.items() if not codec or CACHE_CODECS[codec]}
+        return codecs[compression] if compression in codecs else 0
+
+    def storage(self, file_name):
+        with self.lock:
+            if file_name not in self.storages:
+                settings = tools.load_settings("LaTeXing", cache_backend="pack")
+                if file_name == "tex.cache" and settings["cache_backend"] == "sqlite" and sqlite3:
+                    self.storages[file_name] = SQLiteStorage(self, file_name)
+                else:
+                    self.storages[file_name] = PackStorage(self, file_name)
+            return self.storages[file_name]
+
+    def count(self, key, n=1):
+        with self.stats_lock:
+            self.stats[key] += n
+
+    def record(self, file_name, event, duration, size=0):
+        with self.stats_lock:
+            timing = self.timings.setdefault(file_name, {})
+            timing[event] = timing.get(event, 0) + 1
+            timing[event + "_time"] = timing.get(event + "_time", 0) + duration
+            timing[event + "_bytes"] = timing.get(event + "_bytes", 0) + size
+        log.debug("%s", sublime.encode_value({"cache": file_name, "event": event, "time": round(duration, 4), "bytes": size}))
+
+    def record_parse(self, file_path, duration):
+        with self.stats_lock:
+            self.stats["reparses"] += 1
+            parse = self.parses.setdefault(file_path, {"count": 0, "time": 0, "last": 0})
+            parse["count"] += 1
+            parse["time"] += duration
+            parse["last"] = duration
+        log.debug("%s", sublime.encode_value({"file": file_path, "event": "parse", "time": round(duration, 4)}))
+
+    def summary(self):
+        resident = self.resident
+        with self.stats_lock:
+            stats = dict(self.stats)
+            timings = {key: dict(value) for key, value in self.timings.items()}
+            parses = sorted(self.parses.items(), key=lambda x: x[1]["time"], reverse=True)[:25]
+
+        headers = ["Counter", "Value"]
+        table = [["Entry Hits", stats["hits"]], ["Entry Misses", stats["misses"]], ["Evictions", stats["evictions"]], ["File Hits", stats["file_hits"]], ["Reparses", stats["reparses"]], ["Resident", "%.1f MB" % (resident / 1000000)]]
+        string = tabulate.tabulate(table, headers, tablefmt="grid") + "\n\n"
+
+        headers = ["Cache", "Loads", "Load Time", "Reads", "Read Time", "Saves", "Save Time", "Rebuilds", "Rebuild Time", "Read", "Written"]
+        table = []
+        for file_name, timing in sorted(timings.items()):
+            row = [file_name]
+            for event in ["load", "read", "save", "rebuild"]:
+                row += [timing.get(event, 0), "%.3f s" % timing.get(event + "_time", 0)]
+            row += ["%.1f KB" % ((timing.get("load_bytes", 0) + timing.get("read_bytes", 0)) / 1000), "%.1f KB" % (timing.get("save_bytes", 0) / 1000)]
+            table += [row]
+        string += tabulate.tabulate(table, headers, tablefmt="grid") + "\n\n"
+
+        headers = ["File", "Parses", "Parse Time", "Last"]
+        table = [[file_path.replace(os.path.expanduser("~"), "~"), parse["count"], "%.3f s" % parse["time"], "%.3f s" % parse["last"]] for file_path, parse in parses]
+        string += tabulate.tabulate(table, headers, tablefmt="grid")
+        return string
+
+    def publish(self, file_name, file_json):
+        # Replace the snapshot, readers keep the one they already have
+        cache_data = dict(self.cache_data)
+        if file_json is None:
+            cache_data.pop(file_name, None)
+        else:
+            cache_data[file_name] = file_json
+        self.cache_data = cache_data
+
+    def reset(self):
+        with self.lock:
+            self.cache_data = {}
+            self.dirty = {}
+        with self.lru_lock:
+            self.lru = collections.OrderedDict()
+            self.resident = 0
+
+    def query(self, file_name):
+        # Storage to query the entries, just available for the sqlite backend
+        storage = self.storage(file_name)
+        if not isinstance(storage, SQLiteStorage):
+            return None
+        with self.lock:
+            file_json = self.get_cache(file_name)
+            dirty = self.dirty.pop(file_name, None)
+            if dirty:
+                storage.save(file_json, dirty)
+        return storage
 
     def get_cache(self, file_name):
-        try:
-            if file_name in self.cache_data:
-                file_json = self.cache_data[file_name]
-            else:
-                file_json = sublime.decode_value(self.read_cache(file_name))
-                if "data" not in file_json:
-                    raise Exception
-                self.cache_data[file_name] = file_json
-        except Exception:
-            file_json = {"rtime": "01.01.2000T00:00:00", "data": {}}
-        return file_json
+        # Readers just take the current snapshot without locking
+        file_json = self.cache_data.get(file_name)
+        if file_json is not None and self.journal is not None and file_name not in self.journal:
+            return file_json
+
+        with self.lock:
+            file_json = self.cache_data.get(file_name)
+            if file_json is None:
+                try:
+                    start = time.perf_counter()
+                    if file_name in SHARDED_CACHE_NAMES:
+                        file_json = self.storage(file_name).load()
+                        # Entries of an older monolithic cache are written with the next save
+                        if file_json["data"]:
+                            self.dirty[file_name] = set(file_json["data"].keys())
+                    else:
+                        file_json = self.read_cache(self.cache_path(file_name))
+                        if "data" not in file_json:
+                            raise Exception
+                        log.info("%s (%d items)" % (file_name, len(file_json["data"])))
+                    self.publish(file_name, file_json)
+                    file_path = self.cache_path(file_name)
+                    self.record(file_name, "load", time.perf_counter() - start, os.path.getsize(file_path) if os.path.isfile(file_path) else 0)
+                except Exception:
+                    file_json = {"rtime": CACHE_RESET_RTIME, "data": {}}
+
+            # Apply the changes made after the last snapshot
+            records = self.journal_records().pop(file_name, [])
+            if records:
+                file_json = copy_cache(file_json)
+                for record in records:
+                    file_json = self.replay_record(file_name, file_json, record)
+                self.publish(file_name, file_json)
+            return file_json
 
     def get_cache_data(self, file_name):
+        # Loads all entries, they are evicted again with the next lookup
         file_json = self.get_cache(file_name)
+        if file_name in SHARDED_CACHE_NAMES:
+            file_json = self.load_entries(file_name, self.storage(file_name).keys())
+            for key in list(file_json["data"].keys()):
+                self.touch(file_name, key)
         return file_json["data"]
 
+    def get_cache_entry(self, file_name, key):
+        file_json = self.get_cache(file_name)
+        if key in file_json["data"]:
+            self.count("hits")
+        else:
+            file_json = self.load_entries(file_name, [key])
+            if key not in file_json["data"]:
+                return None
+        self.touch(file_name, key)
+        self.evict()
+        return file_json["data"][key]
+
+    def get_cache_meta(self, file_name, key):
+        # Root, access time and fingerprint of an entry, taken from the index if it is not loaded
+        file_json = self.get_cache(file_name)
+        entry = file_json["data"].get(key) if isinstance(file_json["data"], dict) else None
+        if entry is None and file_name in SHARDED_CACHE_NAMES:
+            meta = self.storage(file_name).meta(key)
+            if meta is not None:
+                return meta
+            entry = self.get_cache_entry(file_name, key)
+        return entry_meta(entry) if entry is not None else None
+
+    def set_cache_entry(self, file_name, key, entry):
+        # Entries are never changed in place, the new one replaces the published entry
+        self.add_cache_data(file_name, {key: entry})
+        return entry
+
+    def get_cache_keys(self, file_name):
+        file_json = self.get_cache(file_name)
+        if file_name in SHARDED_CACHE_NAMES:
+            return set(file_json["data"].keys()) | set(self.storage(file_name).keys())
+        return set(file_json["data"].keys())
+
+    def load_entries(self, file_name, keys):
+        storage = self.storage(file_name)
+        with self.lock:
+            file_json = self.get_cache(file_name)
+            keys = [key for key in keys if storage.contains(key) and key not in file_json["data"]]
+            if not keys:
+                return file_json
+            file_json = copy_cache(file_json)
+            start = time.perf_counter()
+            size = 0
+            for key in keys:
+                self.count("misses")
+                size += storage.size(key)
+                entry = storage.read(key)
+                if entry is None:
+                    storage.remove(key)
+                else:
+                    file_json["data"][key] = entry
+            self.publish(file_name, file_json)
+            self.record(file_name, "read", time.perf_counter() - start, size)
+            return file_json
+
+    def touch(self, file_name, key):
+        # Just entries which are stored on disk can be evicted
+        storage = self.storage(file_name)
+        if not storage.contains(key) or key in self.dirty.get(file_name, ()):
+            return
+        with self.lru_lock:
+            size = self.lru.pop((file_name, key), None)
+            if size is None:
+                size = storage.memory(key)
+                self.resident += size
+            self.lru[(file_name, key)] = size
+
+    def untrack(self, file_name):
+        with self.lru_lock:
+            for item in [item for item in self.lru.keys() if item[0] == file_name]:
+                self.resident -= self.lru.pop(item)
+
+    def memory_budget(self):
+        # Read once, the settings listener resets it
+        if self.budget is None:
+            self.budget = tools.load_settings("LaTeXing", cache_memory=64)["cache_memory"] * 1024 * 1024
+        return self.budget
+
+    def invalidate_budget(self):
+        self.budget = None
+
+    def evict(self):
+        budget = self.memory_budget()
+        if not budget or self.resident <= budget:
+            return
+        items = {}
+        with self.lru_lock:
+            while self.resident > budget and self.lru:
+                (file_name, key), size = self.lru.popitem(last=False)
+                self.resident -= size
+                items.setdefault(file_name, []).append(key)
+
+        evicted = {}
+        with self.lock:
+            for file_name, keys in items.items():
+                if file_name not in self.cache_data:
+                    continue
+                # Changed entries stay until they are saved
+                storage = self.storage(file_name)
+                keys = [key for key in keys if storage.contains(key) and key not in self.dirty.get(file_name, ())]
+                file_json = copy_cache(self.cache_data[file_name])
+                for key in keys:
+                    file_json["data"].pop(key, None)
+                self.publish(file_name, file_json)
+                self.count("evictions", len(keys))
+                evicted[file_name] = keys
+
+        # The names and edges of evicted files are built again with their next parse
+        forget_tex_files(evicted.get("tex.cache", []))
+
+    def journal_records(self):
+        # Read the journal once, the records are grouped by cache name
+        with self.lock:
+            if self.journal is None:
+                journal = {}
+                for file_path in [self.cache_path(JOURNAL_NAME + ".old"), self.cache_path(JOURNAL_NAME)]:
+                    if not os.path.isfile(file_path):
+                        continue
+                    with open(file_path, 'r', encoding="utf-8") as f:
+                        for line in f:
+                            try:
+                                record = sublime.decode_value(line)
+                                journal.setdefault(record["name"], []).append(record)
+                            except Exception:
+                                # Incomplete record of an interrupted write
+                                log.debug("skip %s", line[:80])
+                log.info("%d records" % sum(len(records) for records in journal.values()))
+                self.journal = journal
+            return self.journal
+
+    def replay_record(self, file_name, file_json, record):
+        if record["op"] == "clear":
+            if file_name in SHARDED_CACHE_NAMES:
+                self.storage(file_name).reset()
+            return {"rtime": CACHE_RESET_RTIME, "data": {}}
+        elif record["op"] == "set":
+            file_json["data"] = record["data"]
+            self.dirty[file_name] = set(record["data"].keys()) if file_name in SHARDED_CACHE_NAMES else set()
+        elif record["op"] == "update":
+            # Records without data just carry the rtime, also for caches of lists
+            if record["data"]:
+                file_json["data"].update(record["data"])
+            for key in record["remove"]:
+                file_json["data"].pop(key, None)
+                if file_name in SHARDED_CACHE_NAMES:
+                    self.storage(file_name).remove(key)
+            self.dirty.setdefault(file_name, set()).update(record["data"].keys())
+        file_json["rtime"] = record["rtime"]
+        return file_json
+
+    def write_journal(self, record, str_json=None):
+        # Records encoded beforehand are just appended, the caller holds the lock to keep their order
+        str_json = str_json if str_json is not None else sublime.encode_value(record)
+        with self.lock:
+            if not os.path.isdir(self.cache_path()):
+                os.makedirs(self.cache_path())
+            with open(self.cache_path(JOURNAL_NAME), 'a', encoding="utf-8") as f:
+                f.write(str_json + "\n")
+        log.trace("%s %s (%s)" % (record["name"], record["op"], tools.size_of_string(str_json)))
+
+    def drop_journal_records(self, file_name, offset):
+        # Remove the records of a cache appended before its snapshot was taken at offset
+        with self.lock:
+            for file_path, end in [[self.cache_path(JOURNAL_NAME + ".old"), None], [self.cache_path(JOURNAL_NAME), offset]]:
+                if not os.path.isfile(file_path):
+                    continue
+                with open(file_path, 'rb') as f:
+                    content = f.read()
+                head, tail = (content, b"") if end is None else (content[:end], content[end:])
+                lines = []
+                for line in head.decode("utf-8").splitlines(True):
+                    try:
+                        if sublime.decode_value(line)["name"] == file_name:
+                            continue
+                    except Exception:
+                        pass
+                    lines.append(line)
+                with open(file_path + ".tmp", 'wb') as f:
+                    f.write("".join(lines).encode("utf-8") + tail)
+                os.replace(file_path + ".tmp", file_path)
+
+    def journal_size(self, old=True):
+        size = 0
+        file_paths = [self.cache_path(JOURNAL_NAME + ".old"), self.cache_path(JOURNAL_NAME)] if old else [self.cache_path(JOURNAL_NAME)]
+        for file_path in file_paths:
+            if os.path.isfile(file_path):
+                size += os.path.getsize(file_path)
+        return size
+
     def save_cache(self, mode=None, skip_check=False):
         def save():
+            if not mode:
+                # Replay all records, the journal is dropped after the snapshot
+                for file_name in list(self.journal_records().keys()):
+                    self.get_cache(file_name)
+                with self.lock:
+                    if os.path.isfile(self.cache_path(JOURNAL_NAME)):
+                        with open(self.cache_path(JOURNAL_NAME), 'r', encoding="utf-8") as f:
+                            str_journal = f.read()
+                        with open(self.cache_path(JOURNAL_NAME + ".old"), 'a', encoding="utf-8") as f:
+                            f.write(str_journal)
+                        os.remove(self.cache_path(JOURNAL_NAME))
+
             for file_name in mode if mode else CACHE_NAMES:
-                if file_name in self.cache_data:
-                    str_json = sublime.encode_value(self.cache_data[file_name])
-                    with open(os.path.join(sublime.cache_path(), "LaTeXing", file_name), 'w', encoding="utf-8") as f:
-                        log.trace("%s", f)
-                        f.write(str_json)
-                    log.info("%s (%s)" % (file_name, tools.size_of_string(str_json)))
+                # Take the snapshot and its changes at once, the writing runs without the lock
+                with self.lock:
+                    if file_name not in self.cache_data or file_name not in self.dirty:
+                        continue
+                    file_json = self.cache_data[file_name]
+                    dirty = self.dirty.pop(file_name)
+                    if file_name in SHARDED_CACHE_NAMES:
+                        self.storage(file_name).begin_save()
+                    offset = self.journal_size(False)
+
+                start = time.perf_counter()
+                if file_name in SHARDED_CACHE_NAMES:
+                    size = self.storage(file_name).save(file_json, dirty)
+                    for key in dirty:
+                        self.touch(file_name, key)
+                    self.evict()
+                else:
+                    content = encode_cache(file_json, self.is_binary(), self.codec())
+                    self.write_cache(self.cache_path(file_name), content)
+                    size = len(content)
+                    log.info("%s (%s)" % (file_name, tools.size_of_string(content)))
+                self.record(file_name, "save", time.perf_counter() - start, size)
+
+                # The records of the snapshot are not needed anymore if the journal stays
+                if mode:
+                    self.drop_journal_records(file_name, offset)
+
+            if not mode and os.path.isfile(self.cache_path(JOURNAL_NAME + ".old")):
+                os.remove(self.cache_path(JOURNAL_NAME + ".old"))
+            log.info("%s", sublime.encode_value(dict(self.stats, event="stats", resident=self.resident)))
+
         if skip_check or LTX_TESTING:
             save()
+        elif self.journal_size() < JOURNAL_SIZE:
+            log.debug("Skipped Save")
+        elif not self.timer or not self.timer.is_alive():
+            # Compact the journal into the snapshot in the background
+            self.timer = threading.Thread(target=save)
+            self.timer.start()
         else:
-            if not self.timer:
-                self.timer = threading.Timer(300, save)
-                self.timer.start()
-            elif not self.timer.is_alive():
-                self.timer = threading.Timer(300, save)
-                self.timer.start()
-            else:
-                log.debug("Skipped Save")
+            log.debug("Skipped Save")
 
     def set_cache(self, file_name, file_json, update_rtime=False):
-        if update_rtime:
-            file_json["rtime"] = datetime.datetime.today().strftime("%d.%m.%YT%H:%M:%S")
-        self.cache_data[file_name] = file_json
+        with self.lock:
+            if update_rtime:
+                file_json["rtime"] = datetime.datetime.today().strftime("%d.%m.%YT%H:%M:%S")
+            self.publish(file_name, file_json)
+            self.dirty.setdefault(file_name, set())
 
     def set_cache_data(self, file_name, data, update_rtime=False):
-        file_json = self.get_cache(file_name)
-        file_json["data"] = data
-        self.set_cache(file_name, file_json, update_rtime)
+        sharded = file_name in SHARDED_CACHE_NAMES
+        while True:
+            # Compare and encode against the snapshot without the lock, start over if it got replaced meanwhile
+            file_json = self.get_cache(file_name)
+            storage = self.storage(file_name) if sharded else None
+            old = file_json["data"]
+            if isinstance(data, dict) and isinstance(old, dict):
+                # Just journal entries which are new, changed or removed
+                keys = set(storage.keys()) | set(old.keys()) if sharded else set(old.keys())
+                removed = [key for key in keys if key not in data]
+                if sharded:
+                    changed = {key: value for key, value in data.items() if old.get(key) is not value or not storage.contains(key)}
+                else:
+                    changed = {key: value for key, value in data.items() if key not in old or old[key] != value}
+                record = {"name": file_name, "op": "update", "data": changed, "remove": removed}
+                unchanged = not changed and not removed
+            else:
+                record = {"name": file_name, "op": "set", "data": data}
+                unchanged = old == data
 
-    def add_cache_data(self, file_name, data, update_rtime=False):
-        file_json = self.get_cache(file_name)
-        if isinstance(data, dict):
-            file_json["data"].update(data)
-        else:
-            file_json["data"] += data
-        self.set_cache(file_name, file_json, update_rtime)
+            # Unchanged data just moves the time of the last refresh, nothing is written without it
+            rtime = datetime.datetime.today().strftime("%d.%m.%YT%H:%M:%S") if update_rtime else file_json["rtime"]
+            if unchanged:
+                if rtime == file_json["rtime"]:
+                    return
+                record = {"name": file_name, "op": "update", "data": {}, "remove": []}
+            record["rtime"] = rtime
+            str_json = sublime.encode_value(record)
+
+            with self.lock:
+                current = self.cache_data.get(file_name)
+                if current is not None and current is not file_json:
+                    continue
+                if record["op"] == "update":
+                    if sharded:
+                        for key in record["remove"]:
+                            storage.remove(key)
+                        self.dirty.setdefault(file_name, set()).update(record["data"].keys())
+                self.set_cache(file_name, {"rtime": record["rtime"], "data": old if unchanged else data})
+                self.write_journal(record, str_json)
+            break
+
+        if sharded:
+            for key in data.keys():
+                self.touch(file_name, key)
+            self.evict()
+
+    def add_cache_data(self, file_name, data, update_rtime=False, remove=()):
+        with self.lock:
+            file_json = copy_cache(self.get_cache(file_name))
+            if isinstance(data, dict):
+                file_json["data"].update(data)
+                for key in remove:
+                    file_json["data"].pop(key, None)
+                    if file_name in SHARDED_CACHE_NAMES:
+                        self.storage(file_name).remove(key)
+                if file_name in SHARDED_CACHE_NAMES:
+                    self.dirty.setdefault(file_name, set()).update(data.keys())
+                self.set_cache(file_name, file_json, update_rtime)
+                self.write_journal({"name": file_name, "op": "update", "data": data, "remove": list(remove), "rtime": file_json["rtime"]})
+            else:
+                file_json["data"] += data
+                self.set_cache(file_name, file_json, update_rtime)
+                self.write_journal({"name": file_name, "op": "set", "data": file_json["data"], "rtime": file_json["rtime"]})
 
     def clear_cache(self, file_name, soft):
-        if soft and file_name in self.cache_data:
-            file_json = self.get_cache(file_name)
-            file_json["rtime"] = "01.01.2000T00:00:00"
-            self.set_cache(file_name, file_json)
-        else:
-            file_path = os.path.join(sublime.cache_path(), "LaTeXing", file_name)
-            if os.path.isfile(file_path):
-                os.remove(file_path)
-            if file_name in self.cache_data:
-                self.cache_data.pop(file_name)
+        with self.lock:
+            if soft and file_name in self.cache_data:
+                file_json = copy_cache(self.get_cache(file_name))
+                file_json["rtime"] = CACHE_RESET_RTIME
+                self.set_cache(file_name, file_json)
+                self.write_journal({"name": file_name, "op": "update", "data": {}, "remove": [], "rtime": file_json["rtime"]})
+            else:
+                self.write_journal({"name": file_name, "op": "clear"})
+                if file_name in SHARDED_CACHE_NAMES:
+                    self.storage(file_name).clear()
+                elif os.path.isfile(self.cache_path(file_name)):
+                    os.remove(self.cache_path(file_name))
+                self.publish(file_name, None)
+                self.dirty.pop(file_name, None)
+        if not soft:
+            self.untrack(file_name)
+            if file_name == "tex.cache":
+                forget_tex_files(list(INDEX.files) + list(GRAPH.inputs) + list(TeXFile.roots))
         log.info("%s (%s)" % (file_name, "soft" if soft else "hard"))
 
+    def is_cache_cleared(self, file_name):
+        file_json = self.get_cache(file_name)
+        return file_json["rtime"] == CACHE_RESET_RTIME
+
     def is_cache_outdated(self, file_name, t):
         file_json = self.get_cache(file_name)
         log.debug("%s %s" % (file_name, file_json["rtime"]))
@@ -183,36 +1033,124 @@ class Cache(object):
             return True
 
 CACHE = Cache()
+CACHE_RESET_RTIME = "01.01.2000T00:00:00"
+CACHE_VERSION = 3
 CACHE_NAMES = ["doc.cache", "pkg.cache", "tex.cache", "bib.cache", "bibsonomy.cache", "citeulike.cache", "mendeley.cache", "zotero.cache"]
+SHARDED_CACHE_NAMES = ["tex.cache", "bib.cache"]
+SQL_TABLES = {"acronyms": "ac", "bibitems": "bibitem", "labels": "label", "refs": "ref", "cites": "cite", "inputs": "input", "newcommands": "newcommand", "packages": "packages"}
+SQL_TREE = "WITH RECURSIVE tree(path) AS (VALUES(?) UNION SELECT inputs.child FROM inputs, tree WHERE inputs.path = tree.path) "
+PACK_SLACK = 1024 * 1024
+CACHE_MAGIC = b"LTXC"
+CACHE_FORMAT = 1
+CACHE_HEADER_SIZE = len(CACHE_MAGIC) + 3
+CACHE_CHUNK_SIZE = 256 * 1024
+CACHE_CODECS = {0: None, 1: zlib, 2: lzma}
+CACHE_CODEC_NAMES = {0: "none", 1: "zlib", 2: "lzma"}
+CACHE_WORKERS = 4
+DOC_WORKERS = 8
+DOC_TIMEOUT = 30
+JOURNAL_NAME = "cache.journal"
+JOURNAL_SIZE = 4 * 1024 * 1024
+SYMBOL_KINDS = ["ac", "bibitem", "cite", "label", "newcommand", "newenvironment", "ref"]
+
+
+def copy_cache(file_json):
+    # Shallow copy for the writers, the entries itself are shared
+    data = file_json["data"]
+    return {"rtime": file_json["rtime"], "data": dict(data) if isinstance(data, dict) else list(data)}
+
+
+def encode_cache(value, binary=True, codec=0):
+    if not binary:
+        return sublime.encode_value(value).encode("utf-8")
+    try:
+        content = marshal.dumps(value)
+    except ValueError as e:
+        log.error("%s, fallback to json" % e)
+        return sublime.encode_value(value).encode("utf-8")
+    if codec == 1:
+        content = zlib.compress(content, 1)
+    elif codec == 2:
+        content = lzma.compress(content, preset=1)
+    # Header: magic, format version, codec and marshal version of the writer
+    return CACHE_MAGIC + struct.pack("<BBB", CACHE_FORMAT, codec, marshal.version) + content
+
+
+def read_header(header):
+    # Returns the codec of a binary cache, None for json
+    if not header.startswith(CACHE_MAGIC):
+        return None
+    cache_format, codec, version = struct.unpack_from("<BBB", header, len(CACHE_MAGIC))
+    if cache_format != CACHE_FORMAT or codec not in CACHE_CODECS or (codec and not CACHE_CODECS[codec]) or version > marshal.version:
+        raise ValueError("Unsupported cache format %d.%d.%d" % (cache_format, codec, version))
+    return codec
+
+
+def decode_cache(content):
+    codec = read_header(content[:CACHE_HEADER_SIZE])
+    if codec is None:
+        return sublime.decode_value(content.decode("utf-8"))
+    content = content[CACHE_HEADER_SIZE:]
+    if codec == 1:
+        content = zlib.decompress(content)
+    elif codec == 2:
+        content = lzma.decompress(content)
+    return marshal.loads(content)
 
 
 def cache(mode=["bin.cache"] + CACHE_NAMES):
 
     tools.LtxSettings().set("ltx_rebuild_cache", True)
 
-    if "bin.cache" in mode:
-        cache_bin()
-    if "pkg.cache" in mode:
-        cache_pkg()
-    if "doc.cache" in mode:
-        cache_doc()
-    if "bibsonomy.cache" in mode:
-        cache_bibsonomy()
-    if "citeulike.cache" in mode:
-        cache_citeulike()
-    if "mendeley.cache" in mode:
-        cache_mendeley()
-    if "zotero.cache" in mode:
-        cache_zotero()
-    if "tex.cache" in mode:
-        cache_tex()
-    if "bib.cache" in mode:
-        cache_bib()
+    # Stages and the stages they depend on
+    stages = {
+        "bin.cache": (cache_bin, []),
+        "pkg.cache": (cache_pkg, []),
+        "doc.cache": (cache_doc, ["pkg.cache"]),
+        "bibsonomy.cache": (cache_bibsonomy, []),
+        "citeulike.cache": (cache_citeulike, []),
+        "mendeley.cache": (cache_mendeley, []),
+        "zotero.cache": (cache_zotero, []),
+        "tex.cache": (cache_tex, []),
+        "bib.cache": (cache_bib, [])
+    }
+    run_stages({key: stages[key] for key in mode if key in stages})
 
     tools.LtxSettings().set("ltx_rebuild_cache", False)
     sublime.run_command("ltx_save_cache")
 
 
+def run_stages(stages, workers=CACHE_WORKERS):
+    # Each stage waits for its dependencies, at most workers stages run at once
+    done = {key: threading.Event() for key in stages.keys()}
+    semaphore = threading.BoundedSemaphore(workers)
+    finished = []
+
+    def run(key, function, dependencies):
+        try:
+            for dependency in dependencies:
+                if dependency in done:
+                    done[dependency].wait()
+            with semaphore:
+                start = time.perf_counter()
+                try:
+                    function()
+                except Exception as e:
+                    log.error("%s (%s)" % (key, e))
+                duration = time.perf_counter() - start
+            CACHE.record(key, "rebuild", duration)
+            finished.append(key)
+            sublime.status_message("Caching %s (%d/%d, %.1f s)" % (key, len(finished), len(stages), duration))
+        finally:
+            done[key].set()
+
+    threads = [threading.Thread(target=run, args=(key,) + value) for key, value in stages.items()]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
 def cache_bin():
     dir_path = os.path.join(sublime.cache_path(), "LaTeXing", "bin")
 
@@ -246,13 +1184,31 @@ def cache_doc():
     pkg_data = CACHE.get_cache_data("pkg.cache")
     check_data = {}
     if CACHE.is_cache_outdated("doc.cache", settings["cache"]["doc"]):
-        for key in doc_data.keys():
-            if key in pkg_data:
-                f = DocFile(key)
+        # Just check installed packages, all of them without a package list
+        packages = set(pkg_data["sty"] + pkg_data["cls"]) if "sty" in pkg_data and "cls" in pkg_data else set()
+        keys = [key for key in doc_data.keys() if not packages or key in packages]
+
+        def worker():
+            while True:
+                try:
+                    key = keys.pop()
+                except IndexError:
+                    return
+                f = DocFile(key, timeout=DOC_TIMEOUT)
                 f.run(cache=False, save=True)
-                if len(f.data):
+                # Keep the known documentation if the lookup failed
+                if f.error:
+                    check_data[key] = doc_data[key]
+                elif len(f.data):
                     check_data[key] = f.data
-        CACHE.set_cache_data("doc.cache", doc_data, True)
+
+        threads = [threading.Thread(target=worker) for i in range(min(DOC_WORKERS, len(keys)))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        CACHE.set_cache_data("doc.cache", check_data, True)
+        log.debug("doc cache: %d packages, %d removed" % (len(check_data), len(doc_data) - len(check_data)))
     else:
         log.debug("up to date")
 
@@ -294,9 +1250,8 @@ def cache_bibsonomy():
     else:
         log.debug("up to date")
 
-        # Rebuild Keys
-        for item in bibsonomy_data["cites"]:
-            item["cite_key"] = f.build_cite_key(item)
+        # Rebuild Keys on copies, the cached items are shared with other threads
+        bibsonomy_data = dict(bibsonomy_data, cites=[dict(item, cite_key=f.build_cite_key(item)) for item in bibsonomy_data["cites"]])
 
         # Set the new cache
         CACHE.set_cache_data("bibsonomy.cache", bibsonomy_data, True)
@@ -325,9 +1280,8 @@ def cache_citeulike():
     else:
         log.debug("up to date")
 
-        # Rebuild Keys
-        for item in citeulike_data["cites"]:
-            item["cite_key"] = f.build_cite_key(item)
+        # Rebuild Keys on copies, the cached items are shared with other threads
+        citeulike_data = dict(citeulike_data, cites=[dict(item, cite_key=f.build_cite_key(item)) for item in citeulike_data["cites"]])
 
         # Set the new cache
         CACHE.set_cache_data("citeulike.cache", citeulike_data, True)
@@ -358,9 +1312,8 @@ def cache_mendeley():
     else:
         log.debug("up to date")
 
-        # Rebuild Keys
-        for item in mendeley_data["cites"]:
-            item["cite_key"] = f.build_cite_key(item)
+        # Rebuild Keys on copies, the cached items are shared with other threads
+        mendeley_data = dict(mendeley_data, cites=[dict(item, cite_key=f.build_cite_key(item)) for item in mendeley_data["cites"]])
 
         # Set the new cache
         CACHE.set_cache_data("mendeley.cache", mendeley_data, True)
@@ -388,50 +1341,97 @@ def cache_zotero():
             CACHE.set_cache_data("zotero.cache", zotero_data, True)
     else:
         log.debug("rebuild cite_key")
-        # Rebuild Keys
-        for item in zotero_data["cites"]:
-            item["cite_key"] = f.build_cite_key(item)
+        # Rebuild Keys on copies, the cached items are shared with other threads
+        zotero_data = dict(zotero_data, cites=[dict(item, cite_key=f.build_cite_key(item)) for item in zotero_data["cites"]])
 
         # Set the new cache
         CACHE.set_cache_data("zotero.cache", zotero_data, True)
 
 
+def symbol_names(key, item):
+    # Names by the first {} argument, the keys of cites and refs are split
+    arguments = [argument.split(":", 1)[1] for argument in item["arguments"] if argument.split(":", 1)[0] == "{"]
+    if not arguments:
+        return []
+    return [name.strip() for name in arguments[0].split(",")] if key in ["cite", "ref"] else arguments[:1]
+
+
+def symbol_table(data):
+    # Names in the order of the file, lookups list them the same way every run
+    table = {}
+    for key in SYMBOL_KINDS:
+        table[key] = collections.OrderedDict()
+        for item in data[key] if key in data else []:
+            for name in symbol_names(key, item):
+                table[key].setdefault(name, []).append(item)
+    return table
+
+
+def collect_garbage(file_name, keys, days):
+    # Group the entries by their root file, inactive projects are dropped as a whole
+    projects = {}
+    for key in keys:
+        meta = CACHE.get_cache_meta(file_name, key)
+        if meta is None or not os.path.isfile(key):
+            continue
+        project = projects.setdefault(meta["root"] if "root" in meta else key, {"atime": 0, "keys": []})
+        project["atime"] = max(project["atime"], meta["atime"] if "atime" in meta else time.time())
+        project["keys"] += [key]
+
+    limit = time.time() - days * 86400
+    alive = set()
+    for root, project in projects.items():
+        if not days or project["atime"] >= limit:
+            alive.update(project["keys"])
+        else:
+            log.info("%s: drop %s (%d files)" % (file_name, root, len(project["keys"])))
+    return alive
+
+
 def cache_tex():
-    settings = tools.load_settings("LaTeXing", cache={"tex": 24})
+    settings = tools.load_settings("LaTeXing", cache={"tex": 24}, cache_gc_days=90)
     if not "tex" in settings["cache"] or not settings["cache"]["tex"]:
         return
 
-    tex_data = CACHE.get_cache_data("tex.cache")
+    # Reparse everything after a rebuild, otherwise just the changed files
+    rebuild = CACHE.is_cache_cleared("tex.cache")
+
+    tex_keys = CACHE.get_cache_keys("tex.cache")
+    alive = collect_garbage("tex.cache", tex_keys, settings["cache_gc_days"])
+
+    # Just the outdated files are loaded and parsed again
+    outdated = [f for f in [TeXFile(file_path) for file_path in alive] if rebuild or not f.is_cached("tex.cache")]
+
     check_data = {}
-    if CACHE.is_cache_outdated("tex.cache", settings["cache"]["tex"]):
-        for file_path in tex_data.keys():
-            if os.path.isfile(file_path):
-                f = TeXFile(file_path)
-                f.run(cache=False, save=True)
-                check_data[file_path] = f.data
-        tex_data = check_data
-        CACHE.set_cache_data("tex.cache", tex_data, True)
-    else:
-        log.debug("tex cache: up to date")
+    for f in outdated:
+        f.run(cache=False, save=True)
+        check_data[f.file_path] = f.entry
+    removed = [key for key in tex_keys if key not in alive]
+    CACHE.add_cache_data("tex.cache", check_data, True, removed)
+    forget_tex_files(removed)
+    log.debug("tex cache: %d files, %d parsed, %d removed" % (len(alive), len(check_data), len(removed)))
 
 
 def cache_bib():
-    settings = tools.load_settings("LaTeXing", cache={"bib": 24})
+    settings = tools.load_settings("LaTeXing", cache={"bib": 24}, cache_gc_days=90)
     if not "bib" in settings["cache"] or not settings["cache"]["bib"]:
         return
 
-    bib_data = CACHE.get_cache_data("bib.cache")
+    # Reparse everything after a rebuild, otherwise just the changed files
+    rebuild = CACHE.is_cache_cleared("bib.cache")
+
+    bib_keys = CACHE.get_cache_keys("bib.cache")
+    alive = collect_garbage("bib.cache", bib_keys, settings["cache_gc_days"])
+
+    # Just the outdated files are loaded and parsed again
     check_data = {}
-    if CACHE.is_cache_outdated("bib.cache", settings["cache"]["bib"]):
-        for file_path in bib_data.keys():
-            if os.path.isfile(file_path):
-                f = BibFile(file_path)
-                f.run(cache=False, save=True)
-                check_data[file_path] = f.data
-        bib_data = check_data
-        CACHE.set_cache_data("bib.cache", bib_data, True)
-    else:
-        log.debug("bib cache: up to date")
+    for f in [BibFile(file_path) for file_path in alive]:
+        if rebuild or not f.is_cached("bib.cache"):
+            f.run(cache=False, save=True)
+            check_data[f.file_path] = f.data
+    removed = [key for key in bib_keys if key not in alive]
+    CACHE.add_cache_data("bib.cache", check_data, True, removed)
+    log.debug("bib cache: %d files, %d parsed, %d removed" % (len(alive), len(check_data), len(removed)))
 
 
 class PkgFile():
@@ -462,8 +1462,10 @@ class PkgFile():
 
 class DocFile():
 
-    def __init__(self, key):
+    def __init__(self, key, timeout=None):
         self.key = key
+        self.timeout = timeout
+        self.error = False
         self.data = {}
         self.resources = tools.load_resource("LaTeX.sublime-build", windows={"path": ""})
         self.settings = tools.load_settings("LaTeXing", cache={"doc": 24})
@@ -487,12 +1489,13 @@ class DocFile():
                 miktex = None
 
             if miktex:
-                c = terminal.MthelpCmd(self.key)
+                c = terminal.MthelpCmd(self.key, self.timeout)
             else:
-                c = terminal.TexdocCmd(self.key)
+                c = terminal.TexdocCmd(self.key, self.timeout)
             c.run()
+            self.error = c.error
 
-            if len(c.items) and not c.error:
+            if not c.error and len(c.items):
                 self.data = c.items
 
                 if cache and cache_timeout:
@@ -512,88 +1515,172 @@ class CacheFile(object):
     def save(self):
         self.run(save=True)
 
+    def refresh_atime(self, file_name):
+        # Just once a day, the entry is written again afterwards
+        if time.time() - self.data.get("atime", 0) > 86400:
+            self.data = dict(self.data, atime=int(time.time()))
+            CACHE.add_cache_data(file_name, {self.file_path: self.data})
+
+    def fingerprint(self):
+        fingerprint = tools.file_fingerprint(self.file_path, self.settings["cache_content_hash"])
+        fingerprint["version"] = CACHE_VERSION
+        return fingerprint
+
+    def is_cached(self, file_name):
+        # Checked against the meta data, the entry itself is just loaded for a touched file
+        meta = CACHE.get_cache_meta(file_name, self.file_path)
+        return bool(meta) and self.cached_entry(file_name, meta) is not None
+
+    def current_fingerprint(self, cached_data):
+        # The stored fingerprint if it matches the file on disk, None otherwise
+        fingerprint = cached_data["fingerprint"] if "fingerprint" in cached_data else {}
+        if fingerprint.get("version") != CACHE_VERSION:
+            return None
+        try:
+            st = os.stat(self.file_path)
+        except OSError:
+            return None
+        if fingerprint["mtime"] == st.st_mtime_ns and fingerprint["size"] == st.st_size:
+            return fingerprint
+
+        # Just touched (e.g. by a checkout), the content is still the same
+        if "hash" in fingerprint and fingerprint["size"] == st.st_size and fingerprint["hash"] == tools.file_hash(self.file_path):
+            return dict(fingerprint, mtime=st.st_mtime_ns)
+        return None
+
+    def cached_entry(self, file_name, cached_data):
+        # The cached entry of an unchanged file, touched files are published again with their new modification time
+        fingerprint = self.current_fingerprint(cached_data)
+        if fingerprint is None:
+            return None
+        elif fingerprint is cached_data["fingerprint"]:
+            return cached_data
+        entry = CACHE.get_cache_entry(file_name, self.file_path)
+        return CACHE.set_cache_entry(file_name, self.file_path, dict(entry, fingerprint=fingerprint)) if entry else None
+
 
 class TeXFile(CacheFile):
 
-    def __init__(self, file_path):
+    roots = {}
+
+    def __init__(self, file_path, settings=None):
         self.file_path = os.path.normpath(file_path)
         self.file_dir, self.file_name, self.file_name_root, self.file_name_ext = tools.split_file_path(self.file_path)
 
-        self.settings = tools.load_settings("LaTeXing", default_bib_extension=".bib", default_tex_extension=".tex", cache={"tex": 24}, output_directory=True, output_directory_mode=0, phrase_analyses=1, phrase_minimum_count=2, phrase_minimum_length=3, phrase_maximum_length=5, phrase_bounding_words=[])
+        # Files of one include tree share the settings of the first one
+        self.settings = settings if settings else tools.load_settings("LaTeXing", default_bib_extension=".bib", default_tex_extension=".tex", cache={"tex": 24}, output_directory=True, output_directory_mode=0, phrase_analyses=1, phrase_minimum_count=2, phrase_minimum_length=3, phrase_maximum_length=5, phrase_bounding_words=[], cache_content_hash=False)
+        self.root_tex_file = None
+        # Cache entry of the file on disk, data may overlay the unsaved changes of a view
+        self.entry = {}
         CacheFile.__init__(self)
 
     def run(self, cache=True, save=False):
 
         if not os.path.isfile(self.file_path):
             self.error = True
+            forget_tex_files([self.file_path])
             return
 
         cache_timeout = self.settings["cache"]["tex"] if "tex" in self.settings["cache"] else 0
         if cache_timeout and not save:
-            cached_data = CACHE.get_cache_data("tex.cache")
+            cached_data = CACHE.get_cache_entry("tex.cache", self.file_path)
         else:
-            cached_data = {}
+            cached_data = None
 
-        if self.file_path in cached_data:
-            self.data = cached_data[self.file_path]
+        cached_data = self.cached_entry("tex.cache", cached_data) if cached_data else None
+        if cached_data:
+            CACHE.count("file_hits")
+            self.data = cached_data
+            if cache and cache_timeout:
+                self.refresh_atime("tex.cache")
         else:
+            start = time.perf_counter()
             self.data = {}
-            file_lines, option_lines = tools.read_file_lines(self.file_path)
-
-            self.data["options"] = tools.tex_options(option_lines)
-            name, option = tools.document_class(file_lines)
-            if name:
-                self.data["documentclass"] = {"name": name}
-                if option:
-                    self.data["documentclass"]["option"] = option
-
-            data = {}
-            data["ac"] = tools.find_command_arguments(file_lines, r"(new)?acro(def)?(indefinite|plural)?")
-            data["bibitem"] = tools.find_command_arguments(file_lines, r"bibitem")
-            data["bibliography"] = tools.find_command_arguments(file_lines, r"(bibliography|addbibresource|addglobalbib|addsectionbib)")
-            data["cite"] = tools.find_command_arguments(file_lines, r"(no)?cite\w*", single=True)
-            data["input"] = tools.find_command_arguments(file_lines, r"(input|include|subfile)\**", single=True)
-            data["label"] = tools.find_command_arguments(file_lines, r"(line)?label", single=False)
-            data["newcommand"] = tools.find_command_arguments(file_lines, r"(re)?newcommand")
-            data["newenvironment"] = tools.find_command_arguments(file_lines, r"(re)?newenvironment")
-            data["packages"] = tools.use_packages(file_lines)
-            data["ref"] = tools.find_command_arguments(file_lines, r"\w*ref", single=True)
-
-            if self.settings["phrase_analyses"] > 0:
-                data["words"] = tools.list_words(file_lines)
-
-            for key, value in data.items():
-                if value:
-                    self.data[key] = value
+            # The fingerprint is taken before parsing, changes made meanwhile are parsed with the next refresh
+            self.data["fingerprint"] = self.fingerprint()
+            self.data["atime"] = int(time.time())
+            self.data.update(parser.parse_tex(self.file_path, tools.fallback_encoding(), self.phrases()))
+            # The root file partitions the cache into projects
+            self.data["root"] = self.root_file_path()
+            CACHE.record_parse(self.file_path, time.perf_counter() - start)
 
             if cache and cache_timeout:
                 CACHE.add_cache_data("tex.cache", {self.file_path: self.data})
 
+        # Unsaved changes of an open view take precedence, the symbols follow its changes
+        self.entry = self.data
+        buffer = TeXBuffer.get(self.file_path)
+        stamp = [self.data.get("fingerprint"), None]
+        if buffer:
+            stamp[1] = buffer.change_count
+            self.data = buffer.overlay(self.data)
+
+        # Keep the include graph in step with the inputs
+        root_file_path = self.root_file_path()
+        inputs = self.data["input"] if "input" in self.data else None
+        if not GRAPH.is_current(self.file_path, inputs, root_file_path):
+            GRAPH.update(self.file_path, inputs, root_file_path, self.input_paths(root_file_path))
+        INDEX.update(self.file_path, self.data, stamp)
+
+    def phrases(self):
+        return tools.phrase_settings() if self.settings["phrase_analyses"] > 0 else None
+
+    def input_paths(self, root_file_path):
+        data = []
+        for item in self.data["input"] if "input" in self.data else []:
+            # Check extention and build right file path
+            file_name = item["arguments"][0].split(":", 1)[1]
+            if not os.path.splitext(file_name)[1]:
+                file_name = tools.add_extension(file_name, self.settings["default_tex_extension"])
+            data += [os.path.normpath(os.path.join(os.path.dirname(root_file_path), file_name))]
+        return data
+
+    def walk(self, root=True):
+        # Parsed files of the include tree in include order, each file once
+        if root:
+            root_file = self.root_file()
+            root_file.run()
+        else:
+            root_file = self
+        data = []
+
+        def visit(file_path):
+            if file_path == root_file.file_path:
+                f = root_file
+            else:
+                f = TeXFile(file_path, self.settings)
+                f.run()
+            data.append(f)
+
+        GRAPH.descendants(root_file.file_path, visit)
+        return data
+
     def get(self, key, root=True, walk=True):
         data = []
         if not walk:
             data = [[self.file_path, d] for d in self.data[key]] if key in self.data else []
         else:
-            if root:
-                root_file = self.root_file()
-                root_file.run()
-            else:
-                root_file = self
-            # Save data for the current file
-            data += [[root_file.file_path, d] for d in root_file.data[key]] if key in root_file.data else []
-            # Search through the subfiles
-            for item in root_file.data["input"] if "input" in root_file.data else []:
-                # Check extention and build right file path
-                file_name = item["arguments"][0].split(":", 1)[1]
-                if not os.path.splitext(file_name)[1]:
-                    file_name = tools.add_extension(file_name, self.settings["default_tex_extension"])
-                file_path = os.path.normpath(os.path.join(os.path.dirname(root_file.root_file_path()), file_name))
-                # Parse subfiles
-                f = TeXFile(file_path)
-                f.run()
-                data += f.get(key, root=False, walk=True)
+            for f in self.walk(root):
+                data += [[f.file_path, d] for d in f.data[key]] if key in f.data else []
+        return data
+
+    def find(self, key, name):
+        # Query the index of the sqlite backend first, the symbol index if it has no valid answer
+        storage = CACHE.query("tex.cache") if "tex" in self.settings["cache"] and self.settings["cache"]["tex"] else None
+        data = storage.find(key, name, self.root_file_path()) if storage else None
+        if not data:
+            data = list(self.symbols(key).get(name, []))
         return data
 
+    def symbols(self, key, files=None, walk=True):
+        # Names of the include tree and their [file_path, item] occurrences in include order, files of
+        # an earlier walk are reused and without walk just the files parsed before are looked up
+        if not walk:
+            root_file_path = self.root_file_path()
+            return INDEX.symbols(root_file_path, GRAPH.descendants(root_file_path), key)
+        files = files if files else self.walk()
+        return INDEX.symbols(files[0].file_path, [f.file_path for f in files], key)
+
     def read_file_content(self, **args):
         return tools.read_file_content(self.file_path, **args)
 
@@ -660,6 +1747,16 @@ class TeXFile(CacheFile):
         return root_file.file_dir
 
     def root_file_path(self):
+        # Resolved once per parse of the file and generation of the project and settings
+        key = [tools.resolution_key(), self.data.get("options"), self.data.get("documentclass")]
+        resolved = TeXFile.roots.get(self.file_path)
+        if resolved and resolved[0][0] == key[0] and resolved[0][1] is key[1] and resolved[0][2] is key[2]:
+            return resolved[1]
+        root_file_path = self.resolve_root_file_path()
+        TeXFile.roots[self.file_path] = [key, root_file_path]
+        return root_file_path
+
+    def resolve_root_file_path(self):
         options = self.data["options"] if "options" in self.data else {}
         if "root" in options:
             file_dir = os.path.split(self.file_path)[0]
@@ -678,7 +1775,10 @@ class TeXFile(CacheFile):
         return tools.load_project_setting("root", self.file_path)
 
     def root_file(self):
-        return TeXFile(self.root_file_path())
+        root_file_path = self.root_file_path()
+        if not self.root_tex_file or self.root_tex_file.file_path != root_file_path:
+            self.root_tex_file = TeXFile(root_file_path, self.settings)
+        return self.root_tex_file
 
     def bibliography(self, base_dir=None):
         data = []
@@ -707,36 +1807,285 @@ class TeXFile(CacheFile):
         return "", ""
 
     def files(self, root=True):
-        data = []
-        if root:
-            root_file = self.root_file()
-            root_file.run()
-        else:
-            root_file = self
+        return [f.file_path for f in self.walk(root)]
 
-        # Save data for the current file
-        data += [root_file.file_path]
-        # Search through the subfiles
-        for item in root_file.data["input"] if "input" in root_file.data else []:
-            # Check extention and build right file path
-            file_name = item["arguments"][0].split(":", 1)[1]
-            if not os.path.splitext(file_name)[1]:
-                file_name = tools.add_extension(file_name, self.settings["default_tex_extension"])
-            file_path = os.path.normpath(os.path.join(os.path.dirname(root_file.root_file_path()), file_name))
-            # Parse subfiles
-            f = TeXFile(file_path)
-            f.run()
-            data += f.files(root=False)
+    def words(self, walk=True):
+        counts = collections.Counter()
+        for file_path, (phrase, count) in self.get("words", walk=walk):
+            counts[phrase] += count
+        return [[self.file_path, (count, phrase)] for phrase, count in counts.most_common()]
+
+
+class TeXBuffer(object):
+
+    buffers = {}
+    buffers_lock = threading.Lock()
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.lock = threading.Lock()
+        self.change_count = -1
+        self.dirty = False
+        self.data = None
+
+        # Line indexed parse state of the view, the [kind, item, lines back to its start] completed
+        # in a line and whether a line continues a command started above
+        self.lines = []
+        self.records = []
+        self.covered = []
+
+    @classmethod
+    def get(cls, file_path):
+        buffer = cls.buffers.get(file_path)
+        return buffer if buffer and buffer.dirty else None
+
+    @classmethod
+    def update(cls, view):
+        file_path = os.path.normpath(view.file_name())
+        with cls.buffers_lock:
+            if file_path not in cls.buffers:
+                cls.buffers[file_path] = cls(file_path)
+            buffer = cls.buffers[file_path]
+        buffer.feed(view)
+
+    @classmethod
+    def discard(cls, file_path):
+        with cls.buffers_lock:
+            cls.buffers.pop(os.path.normpath(file_path), None)
+
+    def feed(self, view):
+        with self.lock:
+            change_count = view.change_count()
+            if change_count != self.change_count:
+                self.reparse(view.substr(sublime.Region(0, view.size())).split("\n"))
+                self.change_count = change_count
+            self.dirty = view.is_dirty()
+
+    def reparse(self, lines):
+        old = self.lines
+
+        # Changed lines, old[a:b_old] got replaced by lines[a:b_new]
+        a = 0
+        while a < len(old) and a < len(lines) and old[a] == lines[a]:
+            a += 1
+        b_old, b_new = len(old), len(lines)
+        while b_old > a and b_new > a and old[b_old - 1] == lines[b_new - 1]:
+            b_old -= 1
+            b_new -= 1
+        if a == b_old == b_new and old:
+            return
+
+        # Start at the command running into the first changed line
+        start = min(a, max(0, len(old) - 1))
+        while start > 0 and self.covered[start]:
+            start -= 1
+
+        self.lines = lines
+        self.records[a:b_old] = [None] * (b_new - a)
+        self.covered[a:b_old] = [False] * (b_new - a)
+
+        end = b_new
+        while True:
+            spans = {}
+            records, unclosed = self.parse(start, end, spans)
+            if unclosed and end < len(lines):
+                # Still unclosed, widen the window
+                next_end = min(len(lines), end + max(64, end - start))
+            else:
+                # Lines below which belonged to a command of the window
+                next_end = end
+                while next_end < len(lines) and self.covered[next_end]:
+                    next_end += 1
+            if next_end == end:
+                break
+            end = next_end
+
+        self.records[start:end] = records
+        self.covered[start:end] = [False] * (end - start)
+        for line_number, last_line_number in spans.items():
+            for i in range(line_number, min(last_line_number, end)):
+                self.covered[i] = True
+        self.data = None
+
+    def parse(self, start, end, spans):
+        rex = tools.comment_expression()
+        file_lines = []
+        for i in range(start, end):
+            content = tools.strip_comment(self.lines[i], rex)
+            if content:
+                file_lines += [(i + 1, content)]
+
+        # Items by the line they were completed in, in the order of a full scan
+        added = {}
+        items = []
+        for key, value in tools.scan_commands(file_lines, parser.TEX_COMMANDS, spans, False, added).items():
+            items += [[added[key][i], key, item] for i, item in enumerate(value)]
+        records = [None] * (end - start)
+        for line_number, key, item in sorted(items, key=lambda x: x[0]):
+            i = line_number - 1 - start
+            if records[i] is None:
+                records[i] = []
+            records[i] += [[key, item, line_number - item["line"]]]
+
+        # Commands left open run to the end of the window
+        unclosed = False
+        for line_number, last_line_number in spans.items():
+            if last_line_number > file_lines[-1][0]:
+                spans[line_number] = end + 1
+                unclosed = True
+        return records, unclosed
+
+    def overlay(self, data):
+        with self.lock:
+            if self.data is None:
+                commands = {key: [] for key in parser.TEX_COMMANDS}
+                tags = {key: set() for key in parser.TEX_COMMANDS}
+                for i, records in enumerate(self.records):
+                    for key, item, lines in records or []:
+                        # Lines moved by edits above keep their records
+                        if item["line"] != i + 1 - lines:
+                            item = dict(item, line=i + 1 - lines)
+                        if item["tag"] not in tags[key]:
+                            tags[key].add(item["tag"])
+                            commands[key].append(item)
+                option_lines = [line.strip() for line in self.lines[:9] if line.strip()[:1] == "%"]
+                self.data = parser.command_data(option_lines, commands)
+            live = self.data
+
+        data = {key: value for key, value in data.items() if key not in parser.TEX_COMMANDS and key not in ["documentclass", "options", "packages"]}
+        data.update(live)
         return data
 
-    def words(self, walk=True):
-        data = {}
-        for file_path, item in self.get("words", walk=walk):
-            parts = item.split(":", 1)
-            count = int(parts[0])
-            key = parts[1]
-            data[key] = count if key not in data else data[key] + count
-        return [[self.file_path, (value, key)] for key, value in sorted(data.items(), key=lambda x:x[1], reverse=True)]
+
+class IncludeGraph(object):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Edges of the \input, \include and \subfile items, the parsed items and root they were resolved with
+        self.children = {}
+        self.parents = collections.defaultdict(set)
+        self.inputs = {}
+        self.roots = {}
+
+    def is_current(self, file_path, inputs, root):
+        # Cache entries are immutable, the same items mean the same edges
+        return file_path in self.inputs and self.inputs[file_path] is inputs and self.roots[file_path] == root
+
+    def update(self, file_path, inputs, root, children):
+        with self.lock:
+            for child in self.children.get(file_path, []):
+                self.parents[child].discard(file_path)
+            for child in children:
+                self.parents[child].add(file_path)
+            self.children[file_path] = children
+            self.inputs[file_path] = inputs
+            self.roots[file_path] = root
+
+        for child in children:
+            if file_path in self.descendants(child):
+                log.warning("%s is included by itself through %s" % (file_path, child))
+
+    def remove(self, file_path):
+        with self.lock:
+            for child in self.children.pop(file_path, []):
+                self.parents[child].discard(file_path)
+            self.inputs.pop(file_path, None)
+            self.roots.pop(file_path, None)
+
+    def root(self, file_path):
+        return self.roots.get(file_path)
+
+    def children_of(self, file_path):
+        return list(self.children.get(file_path, []))
+
+    def parents_of(self, file_path):
+        return list(self.parents.get(file_path, []))
+
+    def descendants(self, file_path, visit=None):
+        # Depth first in include order, every file once, so cycles end, visit may update the children of a file
+        data = []
+        visited = set()
+        stack = [file_path]
+        while stack:
+            file_path = stack.pop()
+            if file_path in visited:
+                continue
+            visited.add(file_path)
+            if visit:
+                visit(file_path)
+            data.append(file_path)
+            stack.extend(reversed(self.children.get(file_path, [])))
+        return data
+
+
+GRAPH = IncludeGraph()
+
+
+class SymbolIndex(object):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Stamp and names of every parsed file and the merged names of the include trees by root
+        self.files = {}
+        self.roots = {}
+
+    def update(self, file_path, data, stamp):
+        # The same fingerprint and buffer change count mean the same names
+        if file_path in self.files and stamp[0] is not None and self.files[file_path][0] == stamp:
+            return
+        symbols = symbol_table(data)
+        with self.lock:
+            old = self.files[file_path][1] if file_path in self.files else {}
+            self.files[file_path] = [stamp, symbols]
+
+            # Patch the names of the file in the trees containing it, copy on write for readers
+            for tree in self.roots.values():
+                if file_path not in tree["members"]:
+                    continue
+                index = tree["index"]
+                for key in SYMBOL_KINDS:
+                    names = set(old.get(key, {})) | set(symbols.get(key, {}))
+                    if not names:
+                        continue
+                    index[key] = collections.OrderedDict(index[key])
+                    for name in names:
+                        occurrences = [[f, item] for f in tree["files"] if f in self.files for item in self.files[f][1][key].get(name, [])]
+                        if occurrences:
+                            index[key][name] = occurrences
+                        else:
+                            index[key].pop(name, None)
+
+    def symbols(self, root, file_paths, key):
+        with self.lock:
+            if root not in self.roots or self.roots[root]["files"] != file_paths:
+                index = {k: collections.OrderedDict() for k in SYMBOL_KINDS}
+                for file_path in file_paths:
+                    if file_path not in self.files:
+                        continue
+                    for k, names in self.files[file_path][1].items():
+                        for name, items in names.items():
+                            index[k].setdefault(name, []).extend([file_path, item] for item in items)
+                self.roots[root] = {"files": file_paths, "members": set(file_paths), "index": index}
+            return self.roots[root]["index"][key]
+
+    def remove(self, file_path):
+        # Trees containing the file are merged again with the next lookup
+        with self.lock:
+            if self.files.pop(file_path, None) is None:
+                return
+            for root in [root for root, tree in self.roots.items() if file_path in tree["members"]]:
+                del self.roots[root]
+
+
+INDEX = SymbolIndex()
+
+
+def forget_tex_files(file_paths):
+    # Files dropped from the tex cache leave the index, the include graph and the resolved roots
+    for file_path in file_paths:
+        INDEX.remove(file_path)
+        GRAPH.remove(file_path)
+        TeXFile.roots.pop(file_path, None)
 
 
 class BibFile(CacheFile):
@@ -749,7 +2098,7 @@ class BibFile(CacheFile):
         self.file_name = os.path.basename(file_path)
         self.create_on = create_on
 
-        self.settings = tools.load_settings("LaTeXing", cache={"bib": 24})
+        self.settings = tools.load_settings("LaTeXing", cache={"bib": 24}, cache_content_hash=False)
 
         CacheFile.__init__(self)
 
@@ -764,21 +2113,30 @@ class BibFile(CacheFile):
 
         cache_timeout = self.settings["cache"]["bib"] if "bib" in self.settings["cache"] else 0
         if cache_timeout and not save:
-            cached_data = CACHE.get_cache_data("bib.cache")
+            cached_data = CACHE.get_cache_entry("bib.cache", self.file_path)
         else:
-            cached_data = {}
+            cached_data = None
 
-        if self.file_path in cached_data:
-            self.data = cached_data[self.file_path]
+        cached_data = self.cached_entry("bib.cache", cached_data) if cached_data else None
+        if cached_data:
+            CACHE.count("file_hits")
+            self.data = cached_data
+            if cache and cache_timeout:
+                self.refresh_atime("bib.cache")
         else:
+            start = time.perf_counter()
+            self.data = {}
+            self.data["atime"] = int(time.time())
+            if os.path.isfile(self.file_path):
+                self.data["fingerprint"] = self.fingerprint()
             file_lines = tools.read_file_lines(self.file_path, commentChar=False, lines=False)[0]
 
-            self.data = {}
             try:
                 self.data["cites"] = self.find_cites(file_lines)
             except Exception as e:
                 log.error("%s" % e)
                 self.data["cites"] = []
+            CACHE.record_parse(self.file_path, time.perf_counter() - start)
 
             if cache and cache_timeout:
                 CACHE.add_cache_data("bib.cache", {self.file_path: self.data})
@@ -1127,7 +2485,7 @@ class GlobalBibFile(BibFile):
         self.file_path = file_path
         self.file_name = os.path.basename(file_path)
 
-        self.settings = tools.load_settings("LaTeXing", default_bib_extension=".bib", cache={"global_bib": 24})
+        self.settings = tools.load_settings("LaTeXing", default_bib_extension=".bib", cache={"global_bib": 24}, cache_content_hash=False)
 
         CacheFile.__init__(self)
 
@@ -1142,21 +2500,30 @@ class GlobalBibFile(BibFile):
 
         cache_timeout = self.settings["cache"]["global_bib"] if "global_bib" in self.settings["cache"] else 0
         if cache_timeout and not save:
-            cached_data = CACHE.get_cache_data("bib.cache")
+            cached_data = CACHE.get_cache_entry("bib.cache", self.file_path)
         else:
-            cached_data = {}
+            cached_data = None
 
-        if self.file_path in cached_data:
-            self.data = cached_data[self.file_path]
+        cached_data = self.cached_entry("bib.cache", cached_data) if cached_data else None
+        if cached_data:
+            CACHE.count("file_hits")
+            self.data = cached_data
+            if cache and cache_timeout:
+                self.refresh_atime("bib.cache")
         else:
+            start = time.perf_counter()
+            self.data = {}
+            self.data["atime"] = int(time.time())
+            if os.path.isfile(self.file_path):
+                self.data["fingerprint"] = self.fingerprint()
             file_lines = tools.read_file_lines(self.file_path, commentChar=False, lines=False)[0]
 
-            self.data = {}
             try:
                 self.data["cites"] = self.find_cites(file_lines)
             except Exception as e:
                 log.error("%s" % e)
                 self.data["cites"] = []
+            CACHE.record_parse(self.file_path, time.perf_counter() - start)
 
             if cache and cache_timeout:
                 CACHE.add_cache_data("bib.cache", {self.file_path: self.data})
@@ -9,6 +9,7 @@ import webbrowser
 from . import LTX_VERSION
 from . import cache
 from . import logger
+from . import outline
 from . import progress
 from . import terminal
 from . import tools
@@ -53,13 +54,52 @@ class LtxFoldSectionCommand(sublime_plugin.TextCommand):
         view = self.view
         point = view.sel()[0].a if view.sel()[0].a < view.sel()[0].b else view.sel()[0].b
 
-        dicEnvironment = tools.find_section_range(view, point)
+        dicEnvironment = outline.SectionOutline.get(view).find_section_range(view, point)
         if dicEnvironment:
             view.fold(sublime.Region(view.line(dicEnvironment["start"]).b, dicEnvironment["end"]))
             view.sel().clear()
             view.sel().add(view.line(dicEnvironment["end"]).b + 1)
 
 
+class LtxFoldAllSectionsCommand(sublime_plugin.TextCommand):
+
+    def is_enabled(self):
+        return self.view.match_selector(0, "text.tex.latex")
+
+    def run(self, edit):
+        view = self.view
+
+        # Fold the text of each section up to the next heading, the headings stay visible
+        regions = []
+        for section in outline.SectionOutline.get(view).sections(view):
+            if section["body"] > view.line(section["start"]).b:
+                regions += [sublime.Region(view.line(section["start"]).b, section["body"])]
+        view.fold(regions)
+
+
+class LtxGotoSectionCommand(sublime_plugin.TextCommand):
+
+    def is_enabled(self):
+        return self.view.match_selector(0, "text.tex.latex")
+
+    def run(self, edit):
+        view = self.view
+
+        sections = outline.SectionOutline.get(view).sections(view)
+        if not sections:
+            sublime.status_message("No sections found")
+            return
+
+        level = min(section["level"] for section in sections)
+        message = [["    " * (section["level"] - level) + section["title"], "Line %d" % (section["row"] + 1)] for section in sections]
+
+        def on_done(i):
+            if i >= 0:
+                view.run_command("ltx_select_point", {"point": sections[i]["start"]})
+
+        sublime.set_timeout(lambda: view.window().show_quick_panel(message, on_done), 0)
+
+
 class LtxInsertLatexEnvironmentCommand(sublime_plugin.TextCommand):
 
     def is_enabled(self):
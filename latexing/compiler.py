@@ -376,7 +376,7 @@ class Partial(Default):
         temp_content = partial_begin + include + bibliography + partial_end
 
         # save the file for the partial build
-        with open(self.file_path, "w", encoding=tools.detect_encoding()) as f:
+        with open(self.file_path, "w", encoding=tools.file_encoding(self.root_file.file_path)) as f:
             f.write(temp_content)
 
         # Get pdf_name_root for the jobname
@@ -627,7 +627,7 @@ class Tikz(Default):
         temp_content = partial_begin + include + partial_end
 
         # save the file for the partial build
-        with open(self.file_path, "w", encoding=tools.detect_encoding()) as f:
+        with open(self.file_path, "w", encoding=tools.file_encoding(self.root_file.file_path)) as f:
             f.write(temp_content)
 
         # Remove the fls file is a bug from windows and the synctex file is just required if synctex is enabled
@@ -1,6 +1,9 @@
 import sublime
 import sublime_plugin
 
+import bisect
+import collections
+import heapq
 import os.path
 import re
 import json
@@ -11,6 +14,57 @@ from . import tools
 
 log = logger.getLogger(__name__)
 
+# Most used phrases offered per query
+PHRASES_LIMIT = 100
+
+# Merged phrases kept for the most recently completed projects
+PHRASES_PROJECTS = 8
+
+
+class PhraseIndex(object):
+    # Phrases sorted by their lower case, the phrases starting with the typed prefix are one bisect away
+
+    dictionaries = {}
+    projects = collections.OrderedDict()
+
+    def __init__(self, phrases):
+        self.items = sorted([[phrase.lower(), phrase, count] for phrase, count in phrases])
+        self.keys = [item[0] for item in self.items]
+
+    @classmethod
+    def dictionary(cls, name):
+        # User dictionaries are loaded again when their mtime changes
+        file_path = os.path.join(sublime.packages_path(), "User", "%s.latexing-phrases" % name)
+        mtime = os.stat(file_path).st_mtime_ns
+        if file_path not in cls.dictionaries or cls.dictionaries[file_path][0] != mtime:
+            with open(file_path, 'r', encoding="utf_8") as f:
+                cls.dictionaries[file_path] = [mtime, cls([[item, 0] for item in json.load(f)])]
+        return cls.dictionaries[file_path][1]
+
+    @classmethod
+    def project(cls, tex_file, walk=True):
+        # Phrases of the files, merged again once the fingerprint of one of them changed
+        files = tex_file.walk() if walk else [tex_file]
+        key = [[f.file_path, f.data.get("fingerprint")] for f in files]
+        entry = cls.projects.pop((tex_file.file_path, walk), None)
+        if not entry or entry[0] != key:
+            counts = collections.Counter()
+            for f in files:
+                for phrase, count in f.data["words"] if "words" in f.data else []:
+                    counts[phrase] += count
+            entry = [key, cls(counts.items())]
+        cls.projects[(tex_file.file_path, walk)] = entry
+        while len(cls.projects) > PHRASES_PROJECTS:
+            cls.projects.popitem(last=False)
+        return entry[1]
+
+    def search(self, prefix, limit=0):
+        prefix = prefix.lower()
+        items = self.items[bisect.bisect_left(self.keys, prefix):bisect.bisect_left(self.keys, prefix + chr(0x10ffff))]
+        if limit and len(items) > limit:
+            items = heapq.nlargest(limit, items, key=lambda x: x[2])
+        return items
+
 
 class LtxCompletionsListener(sublime_plugin.EventListener):
 
@@ -73,7 +127,8 @@ class LtxCompletionsListener(sublime_plugin.EventListener):
         for resource in resources:
             items.extend(tools.read_cwl_file(resource))
 
-        for file_path, item in tex_file.get("newcommand", walk=False) + root_file.get("newcommand", walk=False):
+        # Served from the symbol index without walking the tree, every definition is listed
+        for file_path, item in [occurrence for occurrences in tex_file.symbols("newcommand", walk=False).values() for occurrence in occurrences]:
             try:
                 command = item["arguments"][0].split(":", 1)[1]
                 if item["arguments"][1].split(":", 1)[0] == "[":
@@ -91,7 +146,7 @@ class LtxCompletionsListener(sublime_plugin.EventListener):
                 log.debug("skip %s", item)
                 pass
 
-        for file_path, item in tex_file.get("newenvironment", walk=False) + root_file.get("newenvironment", walk=False):
+        for file_path, item in [occurrence for occurrences in tex_file.symbols("newenvironment", walk=False).values() for occurrence in occurrences]:
             try:
                 begin = "\\begin{%s}" % item["arguments"][0].split(":", 1)[1]
                 end = "\\end{%s}" % item["arguments"][0].split(":", 1)[1]
@@ -157,13 +212,12 @@ class LtxCompletionsUserPhrasesListener(sublime_plugin.EventListener):
         if user_phrases:
             for dic in user_phrases.split(","):
                 try:
-                    with open(os.path.join(sublime.packages_path(), "User", "%s.latexing-phrases" % dic.strip()), 'r', encoding="utf_8") as f:
-                        return_items += [[item.replace(" ", u"\u00A0"), item] for item in json.load(f)]
+                    return_items += [[phrase.replace(" ", u"\u00A0"), phrase] for key, phrase, count in PhraseIndex.dictionary(dic.strip()).search(prefix)]
                 except Exception as e:
                     log.error(e)
 
         if settings["phrases_mode"] > 0:
-            used_phrases = tex_file.words(walk=settings["phrases_mode"] == 2)
-            return_items += [[phrase[1].replace(" ", u"\u00A0") + "\t%s" % phrase[0], phrase[1]] for file_path, phrase in used_phrases]
+            used_phrases = PhraseIndex.project(tex_file, walk=settings["phrases_mode"] == 2).search(prefix, PHRASES_LIMIT)
+            return_items += [[phrase.replace(" ", u"\u00A0") + "\t%s" % count, phrase] for key, phrase, count in sorted(used_phrases, key=lambda x: x[2], reverse=True)]
 
         return return_items
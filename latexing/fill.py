@@ -38,8 +38,10 @@ class LtxFillCommand(sublime_plugin.TextCommand):
         # Save current view
         view = self.view
 
-        # Check if dirty and save prior using it
-        if view.is_dirty():
+        # Pick up the unsaved changes of the buffer, a new file has to be saved first
+        if view.file_name():
+            cache.TeXBuffer.update(view)
+        elif view.is_dirty():
             view.settings().set("save_is_dirty", True)
             view.run_command('save')
 
@@ -269,9 +271,9 @@ class LtxFillCommand(sublime_plugin.TextCommand):
                     special_items = args
                     message = [post.string(panel_format=True) for file_path, post in args if items]
                 else:
-                    args_bibitem = tex_file.get("bibitem")
+                    args_bibitem = tex_file.symbols("bibitem")
                     if args_bibitem:
-                        args = [{"key": item["arguments"][0].split(":", 1)[1], "file_name": os.path.basename(file_path)} for file_path, item in args_bibitem]
+                        args = [{"key": key, "file_name": os.path.basename(occurrences[0][0])} for key, occurrences in args_bibitem.items()]
                         items = [item["key"] for item in args if args]
                         message = [["%s" % item["key"], "Bibitem in \"%s\"" % item["file_name"]] for item in args if args]
                     else:
@@ -304,9 +306,9 @@ class LtxFillCommand(sublime_plugin.TextCommand):
             left = point - commaLeft if commaLeft >= 0 else argument["start"]
             right = point + commaRight if commaRight >= 0 else argument["end"]
 
-            args = tex_file.get("label")
-            items = [item["arguments"][0].split(":", 1)[1] for file_path, item in args]
-            message = [[item["arguments"][0].split(":", 1)[1], os.path.relpath(file_path, tex_dir)] for file_path, item in args]
+            args = tex_file.symbols("label")
+            items = list(args.keys())
+            message = [[label, os.path.relpath(occurrences[0][0], tex_dir)] for label, occurrences in args.items()]
 
         elif rexRef.match(dicCommand["name"]) and (argument["pair"] == "{" or "fill_anywhere" in args):
             log.debug("rexRef matched")
@@ -317,9 +319,9 @@ class LtxFillCommand(sublime_plugin.TextCommand):
             left = point - commaLeft if commaLeft >= 0 else argument["start"]
             right = point + commaRight if commaRight >= 0 else argument["end"]
 
-            args = tex_file.get("label")
-            items = [item["arguments"][0].split(":", 1)[1] for file_path, item in args]
-            message = [[item["arguments"][0].split(":", 1)[1], os.path.relpath(file_path, tex_dir)] for file_path, item in args]
+            args = tex_file.symbols("label")
+            items = list(args.keys())
+            message = [[label, os.path.relpath(occurrences[0][0], tex_dir)] for label, occurrences in args.items()]
 
         elif rexAc.match(dicCommand["name"]) and argument["pair"] == "{":
             log.debug("rexAc matched")
@@ -327,9 +329,9 @@ class LtxFillCommand(sublime_plugin.TextCommand):
             left = argument["start"]
             right = argument["end"]
 
-            args = tex_file.get("ac")
-            items = [item["arguments"][0].split(":", 1)[1] for file_path, item in args]
-            message = ["%s (%s)" % (item["arguments"][-1].split(":", 1)[1], item["arguments"][0].split(":", 1)[1]) for file_path, item in args]
+            args = tex_file.symbols("ac")
+            items = list(args.keys())
+            message = ["%s (%s)" % (occurrences[0][1]["arguments"][-1].split(":", 1)[1], acronym) for acronym, occurrences in args.items()]
 
         elif rexUsepackage.match(dicCommand["name"]) and argument["pair"] == "{":
             log.debug("rexUsepackage matched")
@@ -8,15 +8,23 @@ import threading
 import webbrowser
 
 from . import cache
+from . import outline
 from . import tools
 
 
 class LtxTexListener(sublime_plugin.EventListener):
 
     def on_activated(self, view):
+        if view and view.window():
+            tools.watch_resolution(view.window())
+
         if not view or not view.file_name() or len(view.sel()) != 1 or not view.match_selector(0, "text.tex.latex") or view.is_scratch():
             return
 
+    def on_post_window_command(self, window, command_name, args):
+        # Commands switching the project or changing its data
+        tools.watch_resolution(window)
+
     def on_modified(self, view):
         if not view or not view.file_name() or len(view.sel()) != 1 or not view.match_selector(0, "text.tex.latex") or view.is_scratch():
             return []
@@ -35,6 +43,23 @@ class LtxTexListener(sublime_plugin.EventListener):
         if settings["type_scrolling"]:
             view.show_at_center(view.sel()[0].end())
 
+    def on_modified_async(self, view):
+        if not view or not view.match_selector(0, "text.tex.latex") or view.is_scratch():
+            return
+
+        # Move the section outline along with the changed lines
+        outline.SectionOutline.update(view)
+
+        # Reparse the changed lines of the buffer
+        if view.file_name():
+            cache.TeXBuffer.update(view)
+
+    def on_close(self, view):
+        if view:
+            outline.SectionOutline.discard(view)
+        if view and view.file_name():
+            cache.TeXBuffer.discard(view.file_name())
+
     def on_load(self, view):
         if not view or not view.file_name() or not view.match_selector(0, "text.tex.latex"):
             return []
@@ -69,6 +94,10 @@ class LtxTexListener(sublime_plugin.EventListener):
 
     def on_post_save(self, view):
 
+        # Resolve roots and options again after editing the project
+        if view and view.file_name() and view.file_name().endswith(".sublime-project"):
+            tools.invalidate_resolution()
+
         if not view or not view.file_name() or not (view.match_selector(0, "text.tex.latex") or view.match_selector(0, "text.bibtex")):
             return []
 
@@ -78,7 +107,8 @@ class LtxTexListener(sublime_plugin.EventListener):
             bib_file.save()
 
         else:
-            # Cache Information if required
+            # Cache Information if required, the buffer matches the file again
+            cache.TeXBuffer.update(view)
             tex_file = cache.TeXFile(view.file_name())
             tex_file.save()
 
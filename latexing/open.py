@@ -132,11 +132,9 @@ class LtxOpenCommand(sublime_plugin.TextCommand):
                         search = r"@.+\{" + re.escape(argument)
                         break
                 if not len(file_names):
-                    for file_path, item in tex_file.get("bibitem"):
-                        if item["arguments"][0].split(":", 1)[1] == argument:
-                            file_names = [tex_file.file_path]
-                            search = r"\\bibitem\{" + re.escape(argument) + r"\}"
-                            break
+                    if tex_file.find("bibitem", argument):
+                        file_names = [tex_file.file_path]
+                        search = r"\\bibitem\{" + re.escape(argument) + r"\}"
                 if not len(file_names):
                     raise OSError
             except:
@@ -149,12 +147,9 @@ class LtxOpenCommand(sublime_plugin.TextCommand):
                 return
 
             try:
-                for file_path, item in tex_file.get("label"):
-                    print(file_path, item)
-                    if item["arguments"][0].split(":", 1)[1] == argument["content"]:
-                        file_names = [file_path]
-                        search = r"\\(line)?label\{" + re.escape(argument["content"]) + r"\}"
-                        break
+                for file_path, item in tex_file.find("label", argument["content"])[:1]:
+                    file_names = [file_path]
+                    search = r"\\(line)?label\{" + re.escape(argument["content"]) + r"\}"
                 if not len(file_names):
                     raise OSError
             except:
@@ -164,12 +159,9 @@ class LtxOpenCommand(sublime_plugin.TextCommand):
             log.debug("rexRef matched")
 
             try:
-                for file_path, item in tex_file.get("label"):
-                    print(file_path, item)
-                    if item["arguments"][0].split(":", 1)[1] == argument["content"]:
-                        file_names = [file_path]
-                        search = r"\\(line)?label\{" + re.escape(argument["content"]) + r"\}"
-                        break
+                for file_path, item in tex_file.find("label", argument["content"])[:1]:
+                    file_names = [file_path]
+                    search = r"\\(line)?label\{" + re.escape(argument["content"]) + r"\}"
                 if not len(file_names):
                     raise OSError
             except:
@@ -179,11 +171,9 @@ class LtxOpenCommand(sublime_plugin.TextCommand):
             log.debug("rexAc matched")
 
             try:
-                for file_path, item in tex_file.get("ac"):
-                    if item["arguments"][0].split(":", 1)[1] == argument["content"]:
-                        file_names = [file_path]
-                        search = r"\\(new)?acro(def)?(indefinite|plural)?\{" + argument["content"] + r"\}"
-                        break
+                for file_path, item in tex_file.find("ac", argument["content"])[:1]:
+                    file_names = [file_path]
+                    search = r"\\(new)?acro(def)?(indefinite|plural)?\{" + argument["content"] + r"\}"
                 if not len(file_names):
                     raise OSError
             except:
@@ -209,9 +199,8 @@ class LtxOpenCommand(sublime_plugin.TextCommand):
             commandType = "highlight"
 
             items = {}
-            for file_path, item in tex_file.get("ref"):
-                if item["arguments"][0].split(":", 1)[1] == argument["content"]:
-                    file_names += ["%s:%d" % (file_path, item["line"])]
+            for file_path, item in tex_file.find("ref", argument["content"]):
+                file_names += ["%s:%d" % (file_path, item["line"])]
 
         # Check the file names
         items = []
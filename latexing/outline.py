@@ -0,0 +1,128 @@
+import sublime
+
+import bisect
+import re
+import threading
+
+from . import logger
+
+log = logger.getLogger(__name__)
+
+SECTION_LEVELS = {"part": 0, "chapter": 1, "section": 2, "subsection": 3, "subsubsection": 4, "paragraph": 5, "subparagraph": 6}
+
+
+class SectionOutline(object):
+
+    outlines = {}
+    outlines_lock = threading.Lock()
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.change_count = -1
+        self.lines = []
+
+        # Headings of the view as [row, col, level, title] in document order, \end{document} has the
+        # level -1, and for each heading the index of the next one of the same or a higher level
+        self.headings = []
+        self.ends = []
+
+    @classmethod
+    def get(cls, view):
+        with cls.outlines_lock:
+            if view.id() not in cls.outlines:
+                cls.outlines[view.id()] = cls()
+            outline = cls.outlines[view.id()]
+        outline.feed(view)
+        return outline
+
+    @classmethod
+    def update(cls, view):
+        # Just the views an outline was asked for are followed
+        outline = cls.outlines.get(view.id())
+        if outline:
+            outline.feed(view)
+
+    @classmethod
+    def discard(cls, view):
+        with cls.outlines_lock:
+            cls.outlines.pop(view.id(), None)
+
+    def feed(self, view):
+        with self.lock:
+            change_count = view.change_count()
+            if change_count != self.change_count:
+                self.reparse(view.substr(sublime.Region(0, view.size())).split("\n"))
+                self.change_count = change_count
+
+    def reparse(self, lines):
+        old = self.lines
+
+        # Changed lines, old[a:b_old] got replaced by lines[a:b_new]
+        a = 0
+        while a < len(old) and a < len(lines) and old[a] == lines[a]:
+            a += 1
+        b_old, b_new = len(old), len(lines)
+        while b_old > a and b_new > a and old[b_old - 1] == lines[b_new - 1]:
+            b_old -= 1
+            b_new -= 1
+        if a == b_old == b_new and old:
+            return
+
+        # Keep the headings above, scan the changed lines and move the headings below
+        i = bisect.bisect_left(self.headings, [a])
+        j = bisect.bisect_left(self.headings, [b_old])
+        below = [[row + b_new - b_old, col, level, title] for row, col, level, title in self.headings[j:]]
+        self.lines = lines
+        self.headings = self.headings[:i] + self.scan(lines, a, b_new) + below
+
+        self.ends = [None] * len(self.headings)
+        stack = []
+        for k, heading in enumerate(self.headings):
+            while stack and self.headings[stack[-1]][2] >= heading[2]:
+                self.ends[stack.pop()] = k
+            stack.append(k)
+
+    def scan(self, lines, start, end):
+        rex = re.compile(r"\\(part|chapter|section|subsection|subsubsection|paragraph|subparagraph)\*?\s*(?:\[[^\]]*\])?\s*\{([^\}]*)|\\end\{document\}")
+        # An even number of backslashes escapes itself, the % after it starts a comment
+        rex_comment = re.compile(r"(?<!\\)(?:\\\\)*%")
+        headings = []
+        for row in range(start, end):
+            line = lines[row]
+            if "\\" not in line:
+                continue
+            comment = rex_comment.search(line)
+            for expr in rex.finditer(line, 0, comment.end() - 1 if comment else len(line)):
+                if expr.group(1):
+                    headings += [[row, expr.start(), SECTION_LEVELS[expr.group(1)], expr.group(2).strip()]]
+                else:
+                    headings += [[row, expr.start(), -1, "\\end{document}"]]
+        return headings
+
+    def section(self, view, k):
+        # Heading k runs up to the next heading of the same or a higher level, the body up to the next heading
+        row, col, level, title = self.headings[k]
+        start = view.text_point(row, col)
+        end = view.text_point(*self.headings[self.ends[k]][:2]) if self.ends[k] is not None else view.size()
+        body = view.text_point(*self.headings[k + 1][:2]) if k + 1 < len(self.headings) else view.size()
+
+        # The fold stops in front of the blank lines before the next heading
+        while end > start and view.substr(end - 1).isspace():
+            end -= 1
+        while body > start and view.substr(body - 1).isspace():
+            body -= 1
+        return {"start": start, "end": end, "body": body, "row": row, "level": level, "title": title}
+
+    def find_section_range(self, view, point):
+        with self.lock:
+            row, col = view.rowcol(point)
+            k = bisect.bisect_left(self.headings, [row, col + 1]) - 1
+            if k < 0 or self.headings[k][2] < 0:
+                return None
+            section = self.section(view, k)
+        section["point"] = point
+        return section
+
+    def sections(self, view):
+        with self.lock:
+            return [self.section(view, k) for k in range(len(self.headings)) if self.headings[k][2] >= 0]
@@ -0,0 +1,422 @@
+# Parsing of TeX sources, the functions here do not call the sublime API
+
+import codecs
+import collections
+import heapq
+import os
+import re
+
+from array import array
+
+BRACKET_EXPRESSIONS = {}
+# The UTF-32 marks start with the UTF-16 ones and are checked first
+BYTE_ORDER_MARKS = [[codecs.BOM_UTF32_LE, "utf_32"], [codecs.BOM_UTF32_BE, "utf_32"], [codecs.BOM_UTF8, "utf_8_sig"], [codecs.BOM_UTF16_LE, "utf_16"], [codecs.BOM_UTF16_BE, "utf_16"]]
+ENCODINGS = {}
+TEX_COMMANDS = {
+    "ac": [r"(new)?acro(def)?(indefinite|plural)?", False],
+    "bibitem": [r"bibitem", False],
+    "bibliography": [r"(bibliography|addbibresource|addglobalbib|addsectionbib)", False],
+    "cite": [r"(no)?cite\w*", True],
+    "documentclass": [r"documentclass", False],
+    "input": [r"(input|include|subfile)\**", True],
+    "label": [r"(line)?label", False],
+    "newcommand": [r"(re)?newcommand", False],
+    "newenvironment": [r"(re)?newenvironment", False],
+    "ref": [r"(?!href$)\w*ref", True],
+    "usepackage": [r"usepackage", False]
+}
+
+
+def parse_tex(file_path, fallback, phrases=None):
+    # Entry of a tex file without fingerprint and root, phrases are the settings of list_words or None
+    file_lines, option_lines = read_lines(file_path, fallback)
+    data = command_data(option_lines, scan_commands(file_lines, TEX_COMMANDS))
+    if phrases:
+        words = list_words(file_lines, phrases)
+        if words:
+            data["words"] = words
+    return data
+
+
+def command_data(option_lines, data):
+    # Entry layout of the scanned commands, empty kinds are left out
+    entry = {"options": tex_options(option_lines)}
+    name, option = document_class(None, data.pop("documentclass"))
+    if name:
+        entry["documentclass"] = {"name": name}
+        if option:
+            entry["documentclass"]["option"] = option
+
+    data["packages"] = use_packages(None, data.pop("usepackage"))
+    entry.update({key: value for key, value in data.items() if value})
+    return entry
+
+
+class SourceLines(object):
+    # Text of a file with the line numbers and offsets of its uncommented content,
+    # iterating gives (line_number, content) pairs without keeping a dict or a copy per line
+
+    def __init__(self, text, commentChar=r"%", preceding_Text=r"[^\\]"):
+        self.text = text
+        self.numbers = array("I")
+        self.starts = array("I")
+        self.ends = array("I")
+        self.option_lines = []
+
+        rex = comment_expression(commentChar, preceding_Text) if commentChar else None
+        line_number = 0
+        start = 0
+        while start < len(text):
+            end = text.find("\n", start)
+            end = len(text) if end < 0 else end + 1
+            line_number += 1
+            line = text[start:end]
+            content = line.strip()
+
+            # Tex Options
+            if line_number < 10 and content[:1] == "%":
+                self.option_lines += [content]
+
+            # Inline comments run to the end of the line, just the end offset moves
+            if content and content[0] != commentChar:
+                offset = start + len(line) - len(line.lstrip())
+                expr = rex.search(content) if rex else None
+                self.numbers.append(line_number)
+                self.starts.append(offset)
+                self.ends.append(offset + (expr.start() if expr else len(content)))
+            start = end
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def __iter__(self):
+        text = self.text
+        for line_number, start, end in zip(self.numbers, self.starts, self.ends):
+            yield line_number, text[start:end]
+
+
+def decode_content(content, fallback="utf_8"):
+    # Text and encoding of the bytes of a file by its byte order mark, valid UTF-8 or the fallback
+    for mark, encoding in BYTE_ORDER_MARKS:
+        if content.startswith(mark):
+            return content.decode(encoding, errors="ignore"), encoding
+    try:
+        return content.decode("utf_8"), "utf_8"
+    except UnicodeDecodeError:
+        return content.decode(fallback, errors="ignore"), fallback
+
+
+def read_text(file_path, fallback="utf_8", encoding=None):
+    # Text of a file with universal newlines, the encoding is detected once per modification of the file
+    with open(file_path, "rb") as f:
+        st = os.fstat(f.fileno())
+        content = f.read()
+
+    key = [st.st_mtime_ns, st.st_size, fallback]
+    if not encoding and file_path in ENCODINGS and ENCODINGS[file_path][0] == key:
+        encoding = ENCODINGS[file_path][1]
+
+    if encoding:
+        text = content.decode(encoding, errors="ignore")
+    else:
+        text, encoding = decode_content(content, fallback)
+        ENCODINGS[file_path] = [key, encoding]
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def file_encoding(file_path, fallback="utf_8"):
+    # Encoding read_text decodes the file with, to write its content back the same way
+    try:
+        st = os.stat(file_path)
+        if file_path not in ENCODINGS or ENCODINGS[file_path][0] != [st.st_mtime_ns, st.st_size, fallback]:
+            read_text(file_path, fallback)
+        return ENCODINGS[file_path][1]
+    except OSError:
+        return fallback
+
+
+def read_lines(file_path, fallback, commentChar=r"%", preceding_Text=r"[^\\]", lines=True, encoding=None):
+    try:
+        source = SourceLines(read_text(file_path, fallback, encoding), commentChar, preceding_Text)
+    except:
+        source = SourceLines("")
+    return source if lines else [content for line_number, content in source], source.option_lines
+
+
+def comment_expression(commentChar=r"%", preceding_Text=r"[^\\]"):
+    return re.compile(r'(^%s.*)|((?<=%s)%s.*)' % (commentChar, preceding_Text, commentChar))
+
+
+def strip_comment(line, rex, commentChar=r"%"):
+    # Stip line
+    line = line.strip()
+
+    # Break if not line or comment char
+    if not line or line[0] == commentChar:
+        return ""
+
+    # check for inline comment
+    if commentChar:
+        line = rex.sub("", line)
+    return line
+
+
+def bracket_expression(chars):
+    # Compiled once per bracket pair, the helpers below run in tight loops
+    if chars not in BRACKET_EXPRESSIONS:
+        BRACKET_EXPRESSIONS[chars] = re.compile("[%s]" % re.escape(chars))
+    return BRACKET_EXPRESSIONS[chars]
+
+
+def match_bracket(string, offset, open_char, close_char, balance=0, origin=0):
+    # Scan the offsets of string without copying it, a bracket behind a backslash is escaped unless it sits at origin
+    index = -1
+    for expr in bracket_expression(open_char + close_char).finditer(string, offset):
+        position = expr.start()
+        if position > origin and string[position - 1] == "\\":
+            continue
+        index = position + 1
+        balance += 1 if string[position] == open_char else -1
+
+        # Break of balance was even or less (probably a bib file misstake)
+        if balance <= 0:
+            break
+    return index, balance
+
+
+def end_of_argument(string, offset, openPattern, closePattern, balance=0):
+    # Patterns are single, possibly escaped, characters
+    index, balance = match_bracket(string, offset, openPattern[-1], closePattern[-1], balance)
+
+    # Set index to the last index of string
+    if index < 0 and balance <= 0:
+        return "NoMatch"
+    elif balance > 0:
+        return "Unclosed:%d" % balance
+
+    return index
+
+
+def bracket_pairs(string, openPattern, closePattern, offset=0, singlePair=False):
+    pairs = []
+    chars = [[o[-1], c[-1]] for o, c in zip(openPattern, closePattern)]
+    rex = bracket_expression("".join(o for o, c in chars))
+    rex = re.compile(r"\s*(%s)" % rex.pattern)
+
+    expr = rex.match(string, offset)
+    while expr:
+        start = expr.start(1)
+        open_char, close_char = chars[[o for o, c in chars].index(expr.group(1))]
+        end, balance = match_bracket(string, start, open_char, close_char, 0, offset)
+        if balance > 0:
+            break
+        pairs += [{"pair": open_char, "start": start, "end": end, "content": string[start:end]}]
+
+        if singlePair:
+            break
+
+        offset = end
+        expr = rex.match(string, offset)
+
+    return pairs
+
+
+def end_of_command(line, offset=0, open_expr=None):
+    chars = {"{": "}", "[": "]", "(": ")"}
+
+    # Search for unclosed argument
+    if open_expr:
+        end, balance = match_bracket(line, offset, open_expr["start"], chars[open_expr["start"]], open_expr["balance"])
+        if balance > 0:
+            return "Unclosed:%s:%d" % (open_expr["start"], balance)
+        elif end >= 0:
+            offset = end
+
+    # Search for command
+    while offset < len(line) and line[offset] in chars:
+        end, balance = match_bracket(line, offset + 1, line[offset], chars[line[offset]], 1, offset)
+        if balance > 0:
+            return "Unclosed:%s:%d" % (line[offset], balance)
+        offset = end
+    return offset
+
+
+def split_command(string, offset=0, strip=True):
+    rexName = re.compile(r"(?<=\\)([^\{\[\(]+)")
+    pattern = [["\\{", "\\[", "\\("], ["\\}", "\\]", "\\)"]]
+    try:
+        # Find command name
+        expr = rexName.search(string)
+        name = expr.group(0)
+    except AttributeError:
+        return "SplitError"
+
+    items = bracket_pairs(string, pattern[0], pattern[1], expr.end())
+    if strip:
+        arguments = [{"pair": item["pair"], "start": offset + item["start"] + len(item["pair"]), "end": offset + item["end"] - len(item["pair"]), "content": item["content"][len(item["pair"]):-len(item["pair"])]} for item in items]
+    else:
+        arguments = [{"pair": item["pair"], "start": offset + item["start"], "end": offset + item["end"], "content": item["content"]} for item in items]
+    return {"name": name, "arguments": arguments}
+
+
+def scan_commands(file_lines, commands, spans=None, unique=True, added=None):
+    # Walk the lines once and dispatch every \command to the kinds its name matches,
+    # spans collects the last line number reached by commands running over several lines
+    # and added the line numbers the items of each kind were completed in
+    kinds = [[key, re.compile(r"(?:%s)$" % cmd), single] for key, (cmd, single) in commands.items()]
+    rex = re.compile(r"\\(\w+\**)(?=[\{\[\(])")
+    rex_single = re.compile(r"(?P<start>[\{\[\(])(?P<content>[^\}\]\)]+)[\}\]\)]")
+    dispatch = {}
+
+    args = {key: [] for key in commands}
+    tags = {key: set() for key in commands}
+    open_exprs = {}
+
+    def add(key, tag, tag_line, arguments):
+        if not unique or tag not in tags[key]:
+            tags[key].add(tag)
+            args[key].append({"tag": tag, "line": tag_line, "arguments": arguments})
+            if added is not None:
+                added.setdefault(key, []).append(line_number)
+
+    # Search line by line
+    line_number = None
+    for line_number, content in file_lines:
+
+        # If unclosed items available
+        for key, open_expr in list(open_exprs.items()):
+            end = end_of_command(content, 0, open_expr)
+            if isinstance(end, int):
+                # Save item, check tag existince
+                tag = open_expr["line"] + content[:end]
+                command = split_command(tag)
+                add(key, tag, open_expr["line_number"], ["%s:%s" % (c["pair"], c["content"]) for c in command["arguments"]])
+                del open_exprs[key]
+                if spans is not None:
+                    spans[open_expr["line_number"]] = max(spans.get(open_expr["line_number"], 0), line_number)
+            elif end[0:8] == "Unclosed":
+                open_exprs[key] = {"line": open_expr["line"] + content, "line_number": open_expr["line_number"], "start": end[9], "balance": int(end[11:])}
+
+        # Normal search, single arguments are matched without overlap
+        resume = {}
+        for expr in rex.finditer(content):
+            name = expr.group(1)
+            if name not in dispatch:
+                dispatch[name] = [[key, single] for key, rex_name, single in kinds if rex_name.match(name)]
+
+            start = expr.start()
+            for key, single in dispatch[name]:
+                if single:
+                    argument = rex_single.match(content, expr.end()) if start >= resume.get(key, 0) else None
+                    if argument:
+                        resume[key] = argument.end()
+                        add(key, content[start:argument.end()], line_number, ["%s:%s" % (argument.group("start"), argument.group("content"))])
+                    continue
+                end = end_of_command(content, expr.end())
+                if isinstance(end, int):
+                    tag = content[start:end]
+                    if not unique or tag not in tags[key]:
+                        command = split_command(tag)
+                        add(key, tag, line_number, ["%s:%s" % (c["pair"], c["content"]) for c in command["arguments"]])
+                elif end[0:8] == "Unclosed":
+                    # An unclosed command of the same kind is dropped here
+                    if spans is not None and key in open_exprs:
+                        spans[open_exprs[key]["line_number"]] = max(spans.get(open_exprs[key]["line_number"], 0), line_number)
+                    open_exprs[key] = {"line": content[start:], "line_number": line_number, "start": end[9], "balance": int(end[11:])}
+
+    # Unclosed at the end, the command runs past the last line
+    if spans is not None and line_number is not None:
+        for open_expr in open_exprs.values():
+            spans[open_expr["line_number"]] = line_number + 1
+
+    return args
+
+
+def find_command_arguments(file_lines, cmd, single=False):
+    return scan_commands(file_lines, {"arguments": [cmd, single]})["arguments"]
+
+
+def tex_options(option_lines):
+    options = {}
+    rex = re.compile(r"%\s*-\*-\s*(?P<key>\w+)\s*:\s*(?P<value>.+)(?=-\*-)", re.IGNORECASE)
+    rex_textools = re.compile(r"%\s*!TEX\s+root\s*=\s*(?P<value>.*)\s*$", re.IGNORECASE)
+    for line in option_lines:
+        expr = rex.search(line)
+        if expr and expr.group("key") in ["root", "program", "prefix", "phrases", "pdf", "tikz"]:
+            options[expr.group("key")] = expr.group("value").strip()
+            continue
+        expr = rex_textools.search(line)
+        if expr and "root" in ["root", "program", "prefix", "phrases", "pdf", "tikz"]:
+            options["root"] = expr.group("value").strip()
+    return options
+
+
+def document_class(file_lines, documentclass=None):
+    name, option = "", ""
+    try:
+        if documentclass is None:
+            documentclass = find_command_arguments(file_lines, r"documentclass")
+        for argument in documentclass[0]["arguments"]:
+            if argument.split(":", 1)[0] == "{":
+                name = argument.split(":", 1)[1]
+            elif argument.split(":", 1)[0] == "[":
+                option = argument.split(":", 1)[1]
+    except:
+        documentclass = None
+        pass
+    return name, option
+
+
+def use_packages(file_lines, usepackage=None):
+    packages = []
+    if usepackage is None:
+        usepackage = find_command_arguments(file_lines, r"usepackage")
+    for item in usepackage:
+        try:
+            argument = item["arguments"][-1].split(":", 1)
+            if argument[0] == "{":
+                packages += [package.strip() for package in argument[1].split(",") if package.strip()]
+        except IndexError:
+            pass
+    return packages
+
+
+def list_words(file_lines, prefs):
+    # Counts of the phrases of the text as [phrase, count], the n-grams are counted as tuples of word ids
+    rex = re.compile(r"((?<=[^\\\w+])[\w ]+)+")
+    minimum, maximum = max(1, prefs["phrases_min_length"]), prefs["phrases_max_length"]
+    bounding_words = set(prefs["phrases_bounding_words"])
+    ids = {}
+    names = []
+    counts = collections.Counter()
+
+    for line_number, content in file_lines:
+        for item in rex.finditer(content):
+            words = item.group().strip(" ").split(" ")
+            if len(words) < prefs["phrases_min_length"]:
+                continue
+            group = []
+            for word in words:
+                if word not in ids:
+                    ids[word] = len(names)
+                    names.append(word)
+                group.append(ids[word])
+
+            if not bounding_words.intersection(words):
+                for n in range(minimum, min(len(group), maximum) + 1):
+                    counts.update(zip(*[group[k:] for k in range(n)]))
+                continue
+
+            # A bounding word ends the phrases reaching it
+            for i in range(len(group)):
+                for j in range(minimum, min(len(group) - i, maximum) + 1):
+                    if words[i + j - 1] in bounding_words:
+                        break
+                    counts[tuple(group[i:i + j])] += 1
+
+    items = [item for item in counts.items() if item[1] >= prefs["phrases_min_count"]]
+    if prefs["phrases_limit"] > 0:
+        items = heapq.nlargest(prefs["phrases_limit"], items, key=lambda x: x[1])
+    else:
+        items.sort(key=lambda x: x[1], reverse=True)
+    return [[" ".join(names[i] for i in key), count] for key, count in items]
@@ -4,9 +4,11 @@ import sublime_plugin
 import os
 import shutil
 
+from .cache import CACHE
 from .cache import cache
 from .listener import LtxTexListener
 from .progress import progress_function
+from .tools import invalidate_resolution
 from .tools import move_license
 
 
@@ -14,6 +16,10 @@ def ltx_plugin_loaded():
     # move username/license from sublime-settings to sublime-license
     move_license("LaTeXing")
 
+    # Roots and options depend on the settings
+    sublime.load_settings("LaTeXing.sublime-settings").add_on_change("ltx_resolution", invalidate_resolution)
+    sublime.load_settings("LaTeXing.sublime-settings").add_on_change("ltx_cache_memory", CACHE.invalidate_budget)
+
     message = ["Caching Information...", "Finished Caching"]
     progress_function([cache, clean], message[0], message[1], on_load)
 
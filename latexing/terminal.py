@@ -1,17 +1,21 @@
 import sublime
 import sublime_plugin
 
+import contextlib
 import os
 import re
 import shutil
 import subprocess
 import sys
+import threading
 
 from . import logger
 from . import tools
 
 log = logger.getLogger(__name__)
 
+ENVIRON_LOCK = threading.RLock()
+
 
 class KpsewhichCmd():
 
@@ -51,8 +55,9 @@ class KpsewhichCmd():
 
 class MthelpCmd():
 
-    def __init__(self, argument):
+    def __init__(self, argument, timeout=None):
         self.argument = argument
+        self.timeout = timeout
         self.cmd = ""
         self.error = False
 
@@ -68,7 +73,7 @@ class MthelpCmd():
         log.debug("cmd %s" % self.cmd)
 
         try:
-            output = communicate(cmd)[0]
+            output = communicate(cmd, timeout=self.timeout)[0]
         except Exception as e:
             log.error(e)
             self.error = True
@@ -80,8 +85,9 @@ class MthelpCmd():
 
 class TexdocCmd():
 
-    def __init__(self, argument):
+    def __init__(self, argument, timeout=None):
         self.argument = argument
+        self.timeout = timeout
         self.cmd = ""
         self.error = False
 
@@ -97,7 +103,7 @@ class TexdocCmd():
         log.debug("cmd %s" % self.cmd)
 
         try:
-            output = communicate(cmd)[0]
+            output = communicate(cmd, timeout=self.timeout)[0]
         except Exception as e:
             log.error(e)
             self.error = True
@@ -251,22 +257,21 @@ def find_executable(name, error=False, command_line_tool=True):
 def command_executable(cmd, command_line_tool=True):
     log.debug("%s %s" % (cmd, command_line_tool))
 
-    # Set environment path
-    path_bak = set_envionpath()
-
     try:
         if not command_line_tool:
-            status = shutil.which(cmd[0])
+            with environ_path():
+                status = shutil.which(cmd[0])
         else:
             version = ["$host.version"] if "powershell" in cmd[0] else ["--version"]
-            if sublime.platform() == "windows":
-                # Close consol on windows
-                startupinfo = subprocess.STARTUPINFO()
-                startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-                proc = subprocess.Popen(cmd + version, startupinfo=startupinfo, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            with environ_path():
+                if sublime.platform() == "windows":
+                    # Close consol on windows
+                    startupinfo = subprocess.STARTUPINFO()
+                    startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+                    proc = subprocess.Popen(cmd + version, startupinfo=startupinfo, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
 
-            elif sublime.platform() == "osx" or sublime.platform() == "linux":
-                proc = subprocess.Popen(cmd + version, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                elif sublime.platform() == "osx" or sublime.platform() == "linux":
+                    proc = subprocess.Popen(cmd + version, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
 
             proc.wait()
             status = proc.returncode == 0
@@ -277,9 +282,6 @@ def command_executable(cmd, command_line_tool=True):
     except Exception as e:
         log.debug("%s %s" % (e, os.environ["PATH"]))
 
-        # Always reset the path first
-        reset_envionpath(path_bak)
-
         # Fallback search on PATH if full path is given, useful for different machines with the same setting file
         if os.path.basename(cmd[0]) != cmd[0]:
             cmd[0] = os.path.basename(cmd[0])
@@ -287,7 +289,6 @@ def command_executable(cmd, command_line_tool=True):
         else:
             return None
 
-    reset_envionpath(path_bak)
     return cmd[0]
 
 # Deprecated, replaced by find_executable
@@ -356,13 +357,29 @@ def reset_envionpath(path_bak):
     os.environ["PATH"] = path_bak
 
 
-def communicate(cmd, **args):
+@contextlib.contextmanager
+def environ_path():
+    # The PATH is changed for the whole process, keep the other threads out meanwhile
+    with ENVIRON_LOCK:
+        path_bak = set_envionpath()
+        try:
+            yield
+        finally:
+            reset_envionpath(path_bak)
+
+
+def communicate(cmd, timeout=None, **args):
     log.debug("%s" % cmd)
 
     proc = popen(cmd, **args)
 
     # Communicate and capture stdout, and stderr
-    communicate = proc.communicate()
+    try:
+        communicate = proc.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.communicate()
+        raise
     stdout = communicate[0].decode(sys.getfilesystemencoding())
     stderr = communicate[1].decode(sys.getfilesystemencoding())
 
@@ -373,24 +390,17 @@ def popen(cmd, **args):
     log.debug("%s" % cmd)
 
     # Set environment path
-    path_bak = set_envionpath()
-
-    try:
-        if sublime.platform() == "windows":
-            startupinfo = subprocess.STARTUPINFO()
-            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, startupinfo=startupinfo, env=os.environ, **args)
-        elif sublime.platform() == "osx" or sublime.platform() == "linux":
-            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=os.environ, **args)
-
-    except Exception as e:
-        log.error(e)
-        log.error(os.environ["PATH"])
-
-        # Reset environment path
-        reset_envionpath(path_bak)
+    with environ_path():
+        try:
+            if sublime.platform() == "windows":
+                startupinfo = subprocess.STARTUPINFO()
+                startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+                proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, startupinfo=startupinfo, env=os.environ, **args)
+            elif sublime.platform() == "osx" or sublime.platform() == "linux":
+                proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=os.environ, **args)
 
-    # Reset environment path
-    reset_envionpath(path_bak)
+        except Exception as e:
+            log.error(e)
+            log.error(os.environ["PATH"])
 
     return proc